@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for track.
+
+Usage:
+    python3 bench.py [sizes ...] [--output FILE] [--compare FILE]
+
+e.g. "python3 bench.py 10 1000 100000". Each benchmark runs against
+scratch databases in a temporary directory, removed when the run ends, so
+the user's own track.fs is never touched. The cold import times of the modules are checked against
+import_budgets and the exit status is 1 if any of them is over budget.
+
+For each size, a datastore of that many synthetic trackers, much like
+those added by ^e in track, is used to time compute_info, refresh_info,
+get_sorted_trackers, list_trackers, TrackerLexer.lex_document, the commit
+after recording a completion and a full backup.
+
+With --output, all the timings are written as JSON to FILE, and --compare
+prints each of them against those of an earlier run so that regressions
+between versions stand out.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime, timedelta
+
+# the temporary directory of the scratch databases, set by main
+scratch = None
+
+# seconds allowed for a cold "import <module>" in a fresh interpreter
+import_budgets = {
+    'track_core': 0.25,
+    'track_cli': 0.25,
+    'track': 0.6,
+}
+
+import transaction
+from ZODB import DB, FileStorage
+from BTrees.OOBTree import OOBTree
+from dateutil.parser import parse, parserinfo
+from __version__ import version
+from track_core import Tracker, TrackerManager, compute_info_batch
+from track_parse import parse_td
+
+words = "fill feeders water plants change filter furnace oil car check tire pressure pay rent call mom clean gutters".split()
+tags = ["@home", "@car", "@cabin", "@garden", "@bills"]
+
+
+def populate(container, num: int):
+    start = datetime(2024, 1, 1, 8, 0)
+    for doc_id in range(1, num + 1):
+        tracker = Tracker(f"tracker {doc_id}", doc_id)
+        tracker.history = [(start + timedelta(days=7 * i), timedelta(0)) for i in range(4)]
+        container[doc_id] = tracker
+
+
+def bench_commit(num: int, kind: str, repeat: int = 5):
+    """
+    Time a commit that adds a single tracker to a datastore that already
+    holds num trackers and report the number of bytes the commit appended
+    to the FileStorage.
+    """
+    path = os.path.join(scratch, f"commit-{kind}-{num}.fs")
+    storage = FileStorage.FileStorage(path)
+    db = DB(storage)
+    connection = db.open()
+    root = connection.root()
+    trackers = OOBTree() if kind == 'btree' else {}
+    populate(trackers, num)
+    root['trackers'] = trackers
+    transaction.commit()
+
+    seconds = []
+    growth = []
+    for i in range(repeat):
+        doc_id = num + i + 1
+        before = storage.getSize()
+        started = time.perf_counter()
+        trackers[doc_id] = Tracker(f"tracker {doc_id}", doc_id)
+        if kind == 'dict':
+            # a plain dict is not persistent so the root must be re-assigned
+            root['trackers'] = trackers
+        transaction.commit()
+        seconds.append(time.perf_counter() - started)
+        growth.append(storage.getSize() - before)
+
+    connection.close()
+    db.close()
+    for suffix in ['', '.index', '.lock', '.tmp']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return min(seconds), max(growth)
+
+
+def history_string(num: int) -> str:
+    # as written by the edit history dialog
+    start = datetime(2024, 1, 1, 8, 0)
+    completions = [(start + timedelta(days=3 * i, minutes=i), timedelta(days=i % 3 - 1)) for i in range(num)]
+    return "; ".join(Tracker.format_completion(completion, long=True) for completion in completions)
+
+
+def parse_dt_dateutil(dt: str):
+    # parse_dt as it was, with a new parserinfo for every datetime
+    return True, parse(dt, parserinfo=parserinfo(dayfirst=False, yearfirst=True))
+
+
+def parse_completions_dateutil(completions: str):
+    # parse_completions with every datetime going to dateutil
+    output = []
+    for completion in completions.split('; '):
+        dt, td = completion.split(', ')
+        output.append((parse_dt_dateutil(dt)[1], Tracker.parse_td(td)[1]))
+    return output
+
+
+def best_of(repeat: int, func, *args) -> float:
+    seconds = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        seconds.append(time.perf_counter() - started)
+    return min(seconds)
+
+
+def bench_parse(num: int, repeat: int = 3):
+    """
+    Time parse_dt for the datetimes and parse_completions for the whole of a
+    history of num completions, each compared with dateutil alone, and
+    parse_td for the durations compared with parsing them uncached.
+    """
+    completions = history_string(num)
+    datetimes = [completion.split(', ')[0] for completion in completions.split('; ')]
+    durations = [completion.split(', ')[1] for completion in completions.split('; ')]
+    assert Tracker.parse_completions(completions)[1] == parse_completions_dateutil(completions)
+    return (
+        best_of(repeat, lambda: [parse_dt_dateutil(dt) for dt in datetimes]),
+        best_of(repeat, lambda: [Tracker.parse_dt(dt) for dt in datetimes]),
+        best_of(repeat, parse_completions_dateutil, completions),
+        best_of(repeat, Tracker.parse_completions, completions),
+        best_of(repeat, lambda: [parse_td.__wrapped__(td) for td in durations]),
+        best_of(repeat, lambda: [parse_td(td) for td in durations]),
+    )
+
+
+def build_manager(num: int, seed: int = 0) -> TrackerManager:
+    """
+    A TrackerManager for a new datastore of num trackers, each with an even
+    number, up to 8, of completions at roughly regular intervals ending
+    near today as made by add_example_trackers.
+    """
+    rng = random.Random(seed)
+    tracker_manager = TrackerManager(os.path.join(scratch, f"manager-{num}.fs"))
+    today = datetime.now().replace(microsecond=0, second=0, minute=0, hour=0)
+    for doc_id in range(1, num + 1):
+        name = " ".join(rng.sample(words, 3)).capitalize()
+        if rng.random() < 0.5:
+            name += " " + rng.choice(tags)
+        tracker = Tracker(name, doc_id)
+        days = rng.randrange(1, 12)
+        offset = timedelta(minutes=-720 * days)
+        completions = []
+        for i in range(rng.choice(range(0, 9, 2))):
+            offset += timedelta(minutes=days * 1440 + rng.randrange(-144, 144, 12) * days)
+            completions.append(Tracker.dt2seconds(today - offset))
+        tracker.merge_completions(array('q', sorted(completions)), array('q', [0] * len(completions)))
+        tracker_manager.trackers[doc_id] = tracker
+        tracker_manager.name_index.add(doc_id, name)
+    tracker_manager.root['next_id'] = num + 1
+    compute_info_batch(list(tracker_manager.trackers.values()))
+    transaction.commit()
+    return tracker_manager
+
+
+def bench_manager(num: int, repeat: int = 3) -> dict:
+    """
+    Time the model and rendering hot paths for a datastore of num trackers,
+    returning the best of repeat seconds for each.
+    """
+    from prompt_toolkit.document import Document
+    import track
+    from track_backup import run_backup
+
+    tracker_manager = build_manager(num)
+    trackers = list(tracker_manager.trackers.values())
+    results = {}
+    results['compute_info'] = best_of(repeat, lambda: [tracker.compute_info() for tracker in trackers])
+    results['refresh_info'] = best_of(repeat, tracker_manager.refresh_info)
+
+    def sorted_cold():
+        tracker_manager.indexes = {}
+        tracker_manager.get_sorted_trackers(0, 26)
+    results['get_sorted_trackers cold'] = best_of(repeat, sorted_cold)
+    results['get_sorted_trackers'] = best_of(repeat, tracker_manager.get_sorted_trackers, 0, 26)
+
+    def list_cold():
+        tracker_manager.row_cache.clear()
+        tracker_manager.list_trackers()
+    results['list_trackers cold'] = best_of(repeat, list_cold)
+    results['list_trackers'] = best_of(repeat, tracker_manager.list_trackers)
+
+    # the lexer looks up the rows of the page in track's tracker_manager
+    track.tracker_manager = tracker_manager
+    document = Document(tracker_manager.list_trackers())
+    lexer = track.TrackerLexer()
+    def lex():
+        get_line = lexer.lex_document(document)
+        for line_number in range(len(document.lines)):
+            get_line(line_number)
+    def lex_cold():
+        lexer.clear_cache()
+        lex()
+    results['lex_document cold'] = best_of(repeat, lex_cold)
+    results['lex_document'] = best_of(repeat, lex)
+
+    doc_id = num // 2 + 1
+    def commit():
+        tracker_manager.record_completion(doc_id, (datetime.now(), timedelta(0)))
+    results['commit'] = best_of(5, commit)
+
+    db_file = tracker_manager.db_path
+    backup_dir = os.path.join(scratch, f"backup-{num}")
+    os.makedirs(backup_dir, exist_ok=True)
+    size = tracker_manager.storage.getSize()
+    started = time.perf_counter()
+    ok, msg = run_backup(db_file, size, backup_dir, 'bench', [], interval=0.05)
+    results['backup'] = time.perf_counter() - started
+    if not ok:
+        print(msg, file=sys.stderr)
+    results['datastore bytes'] = size
+    tracker_manager.close()
+    return results
+
+
+def bench_import(module: str, repeat: int = 5) -> float:
+    """
+    The best of repeat cold imports of module, each in a fresh interpreter,
+    less the time taken to start the interpreter itself.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    seconds = []
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True, check=True)
+        seconds.append(float(output.stdout))
+    return min(seconds)
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key} / "))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(results: dict, path: str, threshold: float = 1.2):
+    """
+    Print each timing in results against the same timing in the results
+    saved in path, marking those more than threshold times slower.
+    """
+    with open(path) as f:
+        earlier = json.load(f)
+    print(f"compared with {path}, version {earlier.get('version')} of {earlier.get('date')}")
+    print(f"{'benchmark': <48} {'was ms': >10} {'now ms': >10} {'ratio': >7}")
+    before = flatten(earlier['timings'])
+    for key, seconds in flatten(results['timings']).items():
+        if key not in before or not before[key] or key.endswith('bytes'):
+            continue
+        ratio = seconds / before[key]
+        mark = " slower" if ratio > threshold else ""
+        print(f"{key: <48} {before[key] * 1000: >10.2f} {seconds * 1000: >10.2f} {ratio: >6.2f}x{mark}")
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmarks for track.")
+    parser.add_argument('sizes', nargs='*', type=int, default=[10, 1000, 10000, 100000], help="the numbers of trackers or completions")
+    parser.add_argument('--output', help="where to save the timings as JSON")
+    parser.add_argument('--compare', help="the timings of an earlier run to compare against")
+    return parser
+
+
+def main():
+    global scratch
+    args = get_parser().parse_args()
+    with tempfile.TemporaryDirectory(prefix="track-bench-") as scratch:
+        run(args)
+
+
+def run(args):
+    sizes = args.sizes
+    timings = {'import': {}, 'parse': {}, 'commit storage': {}, 'manager': {}}
+    print(f"cold import (best of 5)")
+    print(f"{'module': >10} {'ms': >9} {'budget': >9}")
+    over = []
+    for module, budget in import_budgets.items():
+        seconds = bench_import(module)
+        timings['import'][module] = seconds
+        print(f"{module: >10} {seconds * 1000: >9.1f} {budget * 1000: >9.0f}")
+        if seconds > budget:
+            over.append(module)
+    print()
+
+    print(f"parsing a history against dateutil or, for parse_td, uncached (best of 3)")
+    print(f"{'completions': >11} {'function': >18} {'baseline ms': >12} {'ms': >9} {'speedup': >8}")
+    for num in sizes:
+        results = bench_parse(num)
+        timings['parse'][num] = {}
+        for name, (baseline, seconds) in [('parse_dt', results[:2]), ('parse_completions', results[2:4]), ('parse_td', results[4:])]:
+            timings['parse'][num][name] = seconds
+            print(f"{num: >11} {name: >18} {baseline * 1000: >12.1f} {seconds * 1000: >9.1f} {baseline / seconds: >7.1f}x")
+    print()
+
+    print(f"commit after adding one tracker (best of 5)")
+    print(f"{'trackers': >10} {'kind': >6} {'ms': >9} {'bytes': >10}")
+    for num in sizes:
+        timings['commit storage'][num] = {}
+        for kind in ['dict', 'btree']:
+            seconds, growth = bench_commit(num, kind)
+            timings['commit storage'][num][kind] = seconds
+            print(f"{num: >10} {kind: >6} {seconds * 1000: >9.2f} {growth: >10}")
+    print()
+
+    print(f"trackers in a datastore (best of 3, commit best of 5, backup once)")
+    print(f"{'trackers': >10} {'benchmark': >26} {'ms': >10}")
+    for num in sizes:
+        results = bench_manager(num)
+        timings['manager'][num] = results
+        for name, seconds in results.items():
+            if name != 'datastore bytes':
+                print(f"{num: >10} {name: >26} {seconds * 1000: >10.2f}")
+    print()
+
+    results = dict(
+        version=version,
+        date=datetime.now().isoformat(timespec='seconds'),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        timings=timings,
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"saved the timings in seconds to {args.output}")
+    if args.compare:
+        print()
+        compare(results, args.compare)
+
+    if over:
+        print(f"over the import budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,5 @@
 from setuptools import setup, find_packages
 from __version__ import version
-from track import main
 
 setup(
     name="track-dgraham",  # Replace with your app's name
@@ -12,7 +11,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/dagraham/track-dgraham",  # Replace with the repo URL if applicable
     packages=find_packages(),
-    py_modules=["track"],  # If `track.py` is your main module
+    py_modules=["track", "track_core", "track_cli", "track_import", "track_parse", "track_schedule", "track_backup", "track_server"],  # If `track.py` is your main module
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",  # Replace with your license
@@ -24,9 +23,13 @@ setup(
         'ruamel.yaml>=0.15.88',
         'python-dateutil>=2.7.3',
     ],
+    extras_require={
+        'numpy': ['numpy'],  # batch computation of tracker info for refresh
+        'server': ['ZEO'],  # track serve, sharing the datastore between processes
+    },
     entry_points={
         'console_scripts': [
-            'track=main',  # Replace `main` with the main function to run
+            'track=track_cli:main',  # headless commands or, otherwise, the interface
         ],
     },
 )
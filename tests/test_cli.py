@@ -0,0 +1,76 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import track_cli
+from track_core import TrackerManager
+
+
+def test_record_parses_negative_offset():
+    args = track_cli.get_parser().parse_args(['record', '1', '2024-10-16', '9:00,', '-1h'])
+    assert args.doc_id == 1
+    assert args.completion == ['2024-10-16', '9:00,', '-1h']
+
+
+def test_record_negative_offset(tmp_path, capsys):
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    doc_id = tracker_manager.add_tracker('feeders')
+    tracker_manager.close()
+    with pytest.raises(SystemExit) as exit:
+        track_cli.main(['record', str(doc_id), '2024-10-16', '9:00,', '-1h', '--home', str(tmp_path)])
+    assert exit.value.code == 0, capsys.readouterr().err
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    assert tracker_manager.trackers[doc_id].history == [(datetime(2024, 10, 16, 9, 0), timedelta(hours=-1))]
+    tracker_manager.close()
+
+
+def write_trackers(tmp_path, module: str, monkeypatch):
+    # a datastore from before track_core, with the trackers pickled from
+    # module and no name index
+    import sys
+    import types
+    import transaction
+    from track_core import Tracker
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    doc_id = tracker_manager.add_tracker('Fill feeders')
+    with monkeypatch.context() as patch:
+        patch.setitem(sys.modules, module, sys.modules.get(module) or types.ModuleType(module))
+        patch.setattr(sys.modules[module], 'Tracker', Tracker, raising=False)
+        patch.setattr(Tracker, '__module__', module)
+        # the references to the trackers give their class as well
+        tracker_manager.trackers[doc_id]._p_changed = True
+        tracker_manager.trackers._p_changed = True
+        del tracker_manager.root['name_index']
+        transaction.commit()
+    tracker_manager.connection.close()
+    tracker_manager.db.close()
+
+
+@pytest.mark.parametrize('module', ['__main__', 'track'])
+def test_list_legacy_trackers(tmp_path, capsys, monkeypatch, module):
+    write_trackers(tmp_path, module, monkeypatch)
+    with pytest.raises(SystemExit) as exit:
+        track_cli.main(['list', '--home', str(tmp_path)])
+    out, err = capsys.readouterr()
+    assert exit.value.code == 0, err
+    assert 'Fill feeders' in out
+
+
+def test_list_unreadable_datastore(tmp_path, capsys, monkeypatch):
+    # settings pickled from a module that no longer exists
+    import sys
+    import types
+    import transaction
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    gone = types.ModuleType('gone')
+    exec("class Settings(dict):\n    pass", gone.__dict__)
+    with monkeypatch.context() as patch:
+        patch.setitem(sys.modules, 'gone', gone)
+        tracker_manager.root['settings'] = gone.Settings(tracker_manager.settings)
+        transaction.commit()
+    tracker_manager.close()
+    with pytest.raises(SystemExit) as exit:
+        track_cli.main(['list', '--home', str(tmp_path)])
+    assert exit.value.code == 1
+    assert "Could not open" in capsys.readouterr().err
@@ -0,0 +1,218 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from BTrees.OOBTree import OOBTree
+
+from track_core import NameIndex, Tracker, TrackerManager, compute_info_batch
+
+
+def test_dt2seconds_converts_aware_datetimes_to_local():
+    aware = datetime(2024, 10, 16, 8, 30, tzinfo=timezone.utc)
+    local = aware.astimezone().replace(tzinfo=None)
+    assert Tracker.dt2seconds(aware) == Tracker.dt2seconds(local)
+    assert Tracker.seconds2dt(Tracker.dt2seconds(aware)) == local
+
+
+def test_record_aware_completion():
+    tracker = Tracker('aware', 1)
+    ok, completion = Tracker.parse_completion("2024-10-16 08:30 UTC")
+    assert ok
+    tracker.record_completion(completion)
+    assert tracker.history[0][0] == completion[0].astimezone().replace(tzinfo=None)
+
+
+def test_pack_is_recorded_and_overdue_after_a_week(tmp_path):
+    db_file = os.path.join(tmp_path, 'track.fs')
+    tracker_manager = TrackerManager(db_file)
+    try:
+        # never packed
+        assert tracker_manager.pack_overdue()
+        ok, msg = tracker_manager.pack()
+        assert ok
+        # the pack is recorded with another connection so end this
+        # transaction to see it
+        tracker_manager.save_data()
+        assert not tracker_manager.pack_overdue()
+        tracker_manager.root['last_pack'] -= timedelta(days=8)
+        tracker_manager.save_data()
+    finally:
+        tracker_manager.close()
+    # the time of the last pack is kept in the datastore
+    tracker_manager = TrackerManager(db_file)
+    try:
+        assert tracker_manager.pack_overdue()
+        tracker_manager.settings['pack_days'] = 0
+        assert not tracker_manager.pack_overdue()
+    finally:
+        tracker_manager.close()
+
+
+def test_search_lone_sigil_matches_any_tag():
+    name_index = NameIndex(OOBTree())
+    name_index.add(1, "Fill feeders @home")
+    name_index.add(2, "Change oil")
+    name_index.add(3, "Pay rent @bills")
+    assert list(name_index.search("@")) == [1, 3]
+    assert list(name_index.search("fee @")) == [1]
+    assert list(name_index.search("@ho")) == [1]
+
+
+def make_tracker(doc_id, start, intervals, offsets=()):
+    tracker = Tracker(f"tracker {doc_id}", doc_id)
+    completions = [(start, timedelta(0))]
+    for i, interval in enumerate(intervals):
+        offset = offsets[i] if i < len(offsets) else timedelta(0)
+        completions.append((completions[-1][0] + interval, offset))
+    tracker.record_completions(completions)
+    return tracker
+
+
+def test_compute_info_batch_matches_compute_info():
+    start = datetime(2024, 1, 1, 8, 30)
+    odd = [timedelta(days=d, hours=h, seconds=s) for d, h, s in [(3, 1, 7), (2, 5, 0), (4, 0, 13), (1, 23, 59)]]
+    histories = [
+        [],
+        [timedelta(days=3)],
+        odd,
+        odd * 5,
+        [timedelta(days=7)] * 20,
+    ]
+    trackers = [make_tracker(i, start, intervals, offsets=[timedelta(hours=i)] * len(intervals)) for i, intervals in enumerate(histories)]
+    trackers.append(Tracker('empty', len(trackers)))
+    expected = [tracker.compute_info() for tracker in trackers]
+    assert compute_info_batch(trackers) == expected
+    assert [tracker.info for tracker in trackers] == expected
+
+
+def test_update_info_matches_compute_info():
+    start = datetime(2024, 1, 1, 8, 30)
+    updated, computed = Tracker('updated', 1), Tracker('computed', 2)
+    when = start
+    # past the window, so that intervals slide out of it
+    for i in range(2 * Tracker.window() + 3):
+        when += timedelta(days=1 + i % 4, minutes=7 * i)
+        completion = (when, timedelta(hours=i % 3))
+        # cached before the completion is appended so it is updated
+        updated.info
+        updated.record_completion(completion)
+        computed.record_completion(completion)
+        assert updated.info == computed.compute_info()
+
+
+def test_due_views_boundaries(tmp_path):
+    now = datetime(2024, 10, 16, 12, 0)
+    today = datetime(2024, 10, 16)
+    tomorrow = today + timedelta(days=1)
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    try:
+        def add(name, completions):
+            doc_id = tracker_manager.add_tracker(name)
+            tracker_manager.record_completions(doc_id, [(dt, timedelta(0)) for dt in completions])
+            return doc_id
+
+        def spread(last):
+            # intervals of 1 and 3 days give an early date of last and,
+            # with η = 2, a late date 4 days later
+            return [last - timedelta(days=4), last - timedelta(days=3), last]
+
+        def exact(due):
+            # a single interval: the early and late dates are both due
+            return [due - timedelta(days=2), due - timedelta(days=1)]
+
+        late_today = add('late at the end of today', exact(tomorrow - timedelta(minutes=1)))
+        early_today = add('early today', spread(today + timedelta(hours=9)))
+        early_tomorrow = add('early at the start of tomorrow', spread(tomorrow))
+        late_tomorrow = add('late at the start of tomorrow', exact(tomorrow))
+        end_of_week = add('at the end of the week', exact(today + timedelta(days=7) - timedelta(minutes=1)))
+        add('after the week', exact(today + timedelta(days=7)))
+        add('without a forecast', [today])
+        add('without completions', [])
+        assert tracker_manager.trackers[early_today].info['early'] == today + timedelta(hours=9)
+        assert tracker_manager.trackers[early_today].info['late'] == today + timedelta(days=4, hours=9)
+
+        assert set(tracker_manager.due('overdue', now)) == {late_today}
+        assert set(tracker_manager.due('today', now)) == {early_today}
+        assert set(tracker_manager.due('week', now)) == {early_today, early_tomorrow, late_tomorrow, end_of_week}
+    finally:
+        tracker_manager.close()
+
+
+def make_backups(tmp_path, names):
+    """
+    Back up a datastore as each of names, adding a tracker and recording
+    completions before each, and return the db_file, the backup_dir and
+    the name and history of each tracker.
+    """
+    from track_backup import run_backup
+    db_file = os.path.join(tmp_path, 'track.fs')
+    backup_dir = os.path.join(tmp_path, 'backup')
+    os.mkdir(backup_dir)
+    tracker_manager = TrackerManager(db_file)
+    try:
+        start = datetime(2024, 10, 1, 8, 0)
+        first = None
+        for i, name in enumerate(names):
+            doc_id = tracker_manager.add_tracker(f"tracker {i}")
+            first = first or doc_id
+            tracker_manager.record_completions(doc_id, [(start + timedelta(days=i + j), timedelta(hours=j)) for j in range(3)])
+            # and to a tracker already backed up
+            tracker_manager.record_completion(first, (start + timedelta(days=10 + i), timedelta(0)))
+            tracker_manager.save_data()
+            ok, msg = run_backup(db_file, tracker_manager.storage.getSize(), backup_dir, name, names[:i])
+            assert ok, msg
+        trackers = {doc_id: (tracker.name, tracker.history) for doc_id, tracker in tracker_manager.trackers.items()}
+    finally:
+        tracker_manager.close()
+    return db_file, backup_dir, trackers
+
+
+def test_backups_are_incremental_between_packs(tmp_path):
+    from track_backup import backup_chain, backup_path, read_manifest
+    names = ['241016', '241017', '241018']
+    db_file, backup_dir, trackers = make_backups(tmp_path, names)
+    manifests = [read_manifest(backup_path(backup_dir, name)) for name in names]
+    assert [(m['kind'], m['base'], m['chain']) for m in manifests] == [('full', None, 0), ('incremental', '241016', 1), ('incremental', '241017', 2)]
+    # each backup starts where the one it extends ends
+    assert manifests[0]['start'] == 0
+    assert [m['start'] for m in manifests[1:]] == [m['end'] for m in manifests[:-1]]
+    assert backup_chain(backup_dir, '241018') == names
+
+
+def rewrite_manifest(backup_zip, **changes):
+    import json
+    import zipfile
+    from track_backup import MANIFEST
+    with zipfile.ZipFile(backup_zip) as zipf:
+        members = {name: zipf.read(name) for name in zipf.namelist()}
+    members[MANIFEST] = json.dumps(dict(json.loads(members[MANIFEST]), **changes))
+    with zipfile.ZipFile(backup_zip, 'w') as zipf:
+        for name, data in members.items():
+            zipf.writestr(name, data)
+
+
+def test_restore_backup_chain(tmp_path):
+    from track_backup import backup_path, restore_backup
+    db_file, backup_dir, trackers = make_backups(tmp_path, ['241016', '241017', '241018'])
+    restored = os.path.join(tmp_path, 'restored.fs')
+    ok, msg = restore_backup(backup_dir, '241018', restored)
+    assert ok, msg
+    with open(db_file, 'rb') as original, open(restored, 'rb') as copy:
+        assert original.read() == copy.read()
+    tracker_manager = TrackerManager(restored)
+    try:
+        assert len(tracker_manager.trackers) == len(trackers) == 3
+        assert {doc_id: (tracker.name, tracker.history) for doc_id, tracker in tracker_manager.trackers.items()} == trackers
+    finally:
+        tracker_manager.close()
+
+    # a manifest that doesn't match its backup is rejected and the
+    # restored datastore is left as it was
+    rewrite_manifest(backup_path(backup_dir, '241017'), sha256='0' * 64)
+    with open(restored, 'rb') as f:
+        before = f.read()
+    ok, msg = restore_backup(backup_dir, '241018', restored)
+    assert not ok
+    assert 'sha256' in msg
+    with open(restored, 'rb') as f:
+        assert f.read() == before
+    assert not os.path.exists(restored + '.restore')
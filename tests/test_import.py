@@ -0,0 +1,65 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from track_core import TrackerManager
+from track_import import import_completions, parse_datetime, parse_offset
+
+
+@pytest.fixture
+def tracker_manager(tmp_path):
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    yield tracker_manager
+    tracker_manager.close()
+
+
+def write(tmp_path, name: str, lines: list[str]) -> str:
+    path = os.path.join(tmp_path, name)
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def test_parse_datetime_aware_fallback_is_naive():
+    # not ISO so this goes to dateutil
+    ok, dt = parse_datetime("Oct 16 2024 8:30 UTC")
+    assert ok
+    assert dt.tzinfo is None
+    assert dt == datetime(2024, 10, 16, 8, 30, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+@pytest.mark.parametrize('offset', ['inf', float('inf'), 1e300, float('nan'), [1]])
+def test_parse_offset_rejects_invalid(offset):
+    ok, msg = parse_offset(offset)
+    assert not ok
+
+
+def test_import_skips_aware_fallback_and_bad_offsets(tmp_path, tracker_manager):
+    path = write(tmp_path, 'in.csv', [
+        "feeders, Oct 16 2024 8:30 UTC",
+        "feeders, 2024-10-17T08:30, inf",
+        "feeders, 2024-10-18T08:30, 1e300",
+        "feeders, 2024-10-19T08:30, +1d",
+    ])
+    ok, msg = import_completions(tracker_manager, path)
+    assert not ok
+    assert "Imported 2 completions" in msg
+    assert "Skipped 2 rows" in msg
+    tracker = tracker_manager.trackers[1]
+    assert len(tracker.times) == 2
+
+
+def test_import_rejects_bad_json_trackers(tmp_path, tracker_manager):
+    path = write(tmp_path, 'in.jsonl', [
+        json.dumps({"tracker": 1.5, "datetime": "2024-10-16T08:30"}),
+        json.dumps({"tracker": [1], "datetime": "2024-10-16T08:30"}),
+        json.dumps({"tracker": True, "datetime": "2024-10-16T08:30"}),
+        json.dumps({"tracker": "feeders", "datetime": "2024-10-16T08:30"}),
+    ])
+    ok, msg = import_completions(tracker_manager, path)
+    assert not ok
+    assert "Imported 1 completions for 1 trackers (1 new)" in msg
+    assert "Skipped 3 rows" in msg
+    assert [tracker.name for tracker in tracker_manager.trackers.values()] == ['feeders']
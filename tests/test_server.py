@@ -0,0 +1,188 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('ZEO')
+
+from track_core import TrackerManager, server_address
+from track_server import is_listening
+
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def server(tmp_path):
+    db_file = os.path.join(tmp_path, 'track.fs')
+    tracker_manager = TrackerManager(db_file)
+    tracker_manager.add_tracker('Fill feeders')
+    tracker_manager.close()
+    address = server_address(db_file)
+    process = subprocess.Popen([sys.executable, 'track_cli.py', 'serve', '--home', str(tmp_path)], cwd=here)
+    try:
+        for i in range(100):
+            if is_listening(address):
+                break
+            assert process.poll() is None, "the server stopped"
+            time.sleep(0.1)
+        else:
+            pytest.fail("the server did not start")
+        yield db_file
+    finally:
+        process.terminate()
+        assert process.wait(10) == 0
+    assert not os.path.exists(address)
+
+
+def test_two_clients_share_the_server(server):
+    # each client has its own thread since the transactions are per thread
+    names = ['Water plants', 'Check oil']
+    barrier = threading.Barrier(len(names))
+    results = {}
+
+    def client(name):
+        tracker_manager = TrackerManager(server)
+        try:
+            assert tracker_manager.server
+            # both add a tracker and record a completion for the same one
+            # before either commits
+            doc_id = tracker_manager.add_tracker(name, save=False)
+            tracker_manager.record_completion(1, (datetime(2024, 10, 16, 8, 0) + timedelta(hours=len(name)), timedelta(0)))
+            barrier.wait()
+            tracker_manager.save_data()
+            barrier.wait()
+            # the server tells each client of the other's commit in the
+            # background, as with each tick of the interface's clock
+            for i in range(50):
+                synced = tracker_manager.sync()
+                if synced and len(tracker_manager.trackers) == 3:
+                    break
+                time.sleep(0.1)
+            # the list is made from the indexes, which must include the
+            # tracker added by the other
+            listed = tracker_manager.list_trackers()
+            results[name] = (doc_id, synced, [tracker for tracker in ['Check oil', 'Fill feeders', 'Water plants'] if tracker in listed], len(tracker_manager.trackers[1].history))
+        except Exception as e:
+            results[name] = e
+            barrier.abort()
+        finally:
+            tracker_manager.close()
+
+    threads = [threading.Thread(target=client, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    for name in names:
+        assert not isinstance(results[name], Exception), results[name]
+    # different doc_ids and each sees the tracker added by the other and
+    # both completions
+    assert {results[name][0] for name in names} == {2, 3}
+    for name in names:
+        doc_id, synced, trackers, completions = results[name]
+        assert synced
+        assert trackers == ['Check oil', 'Fill feeders', 'Water plants']
+        assert completions == 2
+
+
+def in_thread(func):
+    # run func in a thread of its own, and so a transaction of its own,
+    # returning a function to wait for and return its result
+    result = {}
+    def run():
+        try:
+            result['value'] = func()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    def wait():
+        thread.join(30)
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+    return wait
+
+
+def test_sync_keeps_a_recorded_completion(server):
+    completion = (datetime(2024, 10, 16, 8, 0), timedelta(0))
+    tracker_manager = TrackerManager(server)
+    try:
+        # as the complete dialog does, without calling save_data itself
+        tracker_manager.record_completion(1, completion)
+        # another client commits and the interface syncs
+        def other():
+            other_manager = TrackerManager(server)
+            try:
+                other_manager.add_tracker('Water plants')
+            finally:
+                other_manager.close()
+        in_thread(other)()
+        for i in range(50):
+            if tracker_manager.sync():
+                break
+            time.sleep(0.1)
+        assert 'Water plants' in tracker_manager.list_trackers()
+    finally:
+        tracker_manager.connection.close()
+        tracker_manager.db.close()
+    tracker_manager = TrackerManager(server)
+    try:
+        assert tracker_manager.trackers[1].history == [completion]
+    finally:
+        tracker_manager.close()
+
+
+def test_clients_add_trackers_with_a_shared_new_word(server):
+    first_added = threading.Event()
+    read = threading.Event()
+
+    def first():
+        tracker_manager = TrackerManager(server)
+        try:
+            read.wait(10)
+            return tracker_manager.add_tracker('Water plants garden')
+        finally:
+            first_added.set()
+            tracker_manager.close()
+
+    def second():
+        tracker_manager = TrackerManager(server)
+        try:
+            # the name index is read in the transaction that adds the
+            # tracker, before the first adds its own
+            assert not tracker_manager.name_index.search('garden')
+            read.set()
+            first_added.wait(10)
+            # both add 'garden' to the index, so this commit conflicts and
+            # is made again
+            doc_id = tracker_manager.add_tracker('Weed beds garden')
+            return doc_id, sorted(tracker_manager.name_index.search('garden'))
+        finally:
+            tracker_manager.close()
+
+    wait_first, wait_second = in_thread(first), in_thread(second)
+    first_id = wait_first()
+    second_id, garden = wait_second()
+    assert garden == sorted([first_id, second_id])
+
+
+def test_stale_socket_is_ignored(tmp_path):
+    import socket
+    db_file = os.path.join(tmp_path, 'track.fs')
+    address = server_address(db_file)
+    # as left behind by a server that was killed
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.bind(address)
+    started = time.perf_counter()
+    tracker_manager = TrackerManager(db_file)
+    try:
+        assert tracker_manager.server is None
+        assert time.perf_counter() - started < 2
+    finally:
+        tracker_manager.close()
+    assert not any(name.endswith('.zec') for name in os.listdir(tmp_path))
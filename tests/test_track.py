@@ -0,0 +1,176 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from prompt_toolkit.widgets import TextArea
+
+import track
+from track_core import TrackerManager
+
+
+@pytest.fixture
+def tracker_manager(tmp_path, monkeypatch):
+    tracker_manager = TrackerManager(os.path.join(tmp_path, 'track.fs'))
+    # the lexer looks up the trackers of the listed page in track's manager
+    monkeypatch.setattr(track, 'tracker_manager', tracker_manager)
+    track.TrackerLexer().clear_cache()
+    yield tracker_manager
+    tracker_manager.close()
+
+
+def test_list_colors_change_at_midnight(tracker_manager, monkeypatch):
+    today = datetime(2024, 10, 16, 23, 59)
+    doc_id = tracker_manager.add_tracker('Fill feeders')
+    tracker_manager.record_completions(doc_id, [(today - timedelta(days=14), timedelta(0)), (today - timedelta(days=7), timedelta(0))])
+    text = tracker_manager.list_trackers()
+    # fine until the alert date tomorrow, then alert until the warn date
+    tracker_manager.id_to_times[doc_id] = ('24-10-17', '24-10-19')
+
+    class Now(datetime):
+        current = today
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current
+
+    monkeypatch.setattr(track, 'datetime', Now)
+    # as the display area is made, with the lexer wrapped by the TextArea
+    display_area = TextArea(text=text, read_only=True, lexer=track.TrackerLexer())
+    line = next(i for i, line in enumerate(text.splitlines()) if 'Fill feeders' in line)
+
+    async def style():
+        # the buffer loads its history on the running loop
+        content = display_area.control.create_content(width=80, height=10)
+        return next(style for style, text, *rest in content.get_line(line) if 'Fill feeders' in text)
+
+    assert asyncio.run(style()) == track.tracker_style['next-fine']
+    Now.current = today + timedelta(minutes=2)
+    # as the scheduler does at midnight
+    monkeypatch.setattr(track, 'app', type('App', (), {'invalidate': lambda self: None})())
+    track.new_day()
+    assert asyncio.run(style()) == track.tracker_style['next-alert']
+
+
+def test_resize_updates_the_width(monkeypatch):
+    import signal
+    import track_core
+
+    class Output:
+        columns = 100
+
+        def get_size(self):
+            return type('Size', (), {'columns': self.columns})()
+
+    class App:
+        output = Output()
+        invalidated = 0
+
+        def invalidate(self):
+            self.invalidated += 1
+
+    app = App()
+    monkeypatch.setattr(track, 'app', app)
+    monkeypatch.setattr(track, 'current_view', None)
+    monkeypatch.setattr(track_core, 'terminal_width', 80)
+
+    async def resize():
+        await track.handle_resize()
+        os.kill(os.getpid(), signal.SIGWINCH)
+        # the handler runs on the loop
+        for i in range(50):
+            if app.invalidated:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(resize())
+    assert track_core.get_width() == 100
+    assert app.invalidated == 1
+
+
+def test_import_does_not_sample_the_terminal():
+    import subprocess
+    import sys
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import shutil\ndef fail(*args): raise AssertionError('sampled the terminal')\nshutil.get_terminal_size = fail\nimport track"
+    result = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_sort_and_view_keys_only_fire_in_their_dialog(tracker_manager, monkeypatch):
+    from prompt_toolkit.key_binding import KeyBindings
+    kb = KeyBindings()
+    monkeypatch.setattr(track, 'action', [""])
+    dialogs = {name: track.Dialog(name, kb, track.tag_keys, track.bool_keys, tracker_manager, track.message_control, track.display_area, track.wrap) for name in ('sort', 'view')}
+    dialogs['sort'].set_sort_mode()
+    dialogs['view'].set_view_mode()
+
+    def active(key):
+        return {binding.handler.__code__.co_names[0] for binding in kb.get_bindings_for_keys((key,)) if binding.filter()}
+
+    # the view dialog is open, the sort keys are not handled
+    assert active('escape') == {'handle_view'}
+    assert active('n') == set()
+    dialogs['sort'].set_sort_mode()
+    assert active('escape') == {'handle_sort'}
+    assert active('o') == set()
+    track.set_mode('menu')
+
+
+def test_scheduler_runs_jobs_at_their_times():
+    from track_schedule import Scheduler, at_midnight, every, weekly
+    # a Saturday
+    clock = [datetime(2024, 10, 19, 23, 59, 40)]
+    scheduler = Scheduler(clock=lambda: clock[0])
+    fired = []
+    for name, next_time in [('new day', at_midnight), ('pack', weekly(6)), ('tick', every(15))]:
+        scheduler.add(name, lambda name=name: fired.append((name, clock[0])), next_time)
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0)
+        while clock[0] < datetime(2024, 10, 20, 0, 0, 20):
+            clock[0] += timedelta(seconds=5)
+            # wake the scheduler as if the time had passed
+            scheduler.changed.set()
+            for i in range(20):
+                await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    midnight = datetime(2024, 10, 20)
+    assert fired == [
+        ('tick', datetime(2024, 10, 19, 23, 59, 45)),
+        ('new day', midnight),
+        ('pack', midnight),
+        ('tick', midnight),
+        ('tick', midnight + timedelta(seconds=15)),
+    ]
+    assert sorted((when, job.name) for when, count, job in scheduler.heap) == [
+        (midnight + timedelta(seconds=30), 'tick'),
+        (midnight + timedelta(days=1), 'new day'),
+        (midnight + timedelta(days=7), 'pack'),
+    ]
+
+
+@pytest.mark.parametrize('now, expected', [
+    (datetime(2024, 10, 16, 23, 59, 59), datetime(2024, 10, 17)),
+    # exactly midnight is the start of today, the next is tomorrow's
+    (datetime(2024, 10, 17), datetime(2024, 10, 18)),
+])
+def test_at_midnight(now, expected):
+    from track_schedule import at_midnight
+    assert at_midnight(now) == expected
+
+
+@pytest.mark.parametrize('now, expected', [
+    # Wednesday to the coming Sunday
+    (datetime(2024, 10, 16, 12, 0), datetime(2024, 10, 20)),
+    (datetime(2024, 10, 19, 23, 59), datetime(2024, 10, 20)),
+    # a week on from the start of Sunday
+    (datetime(2024, 10, 20), datetime(2024, 10, 27)),
+    (datetime(2024, 10, 20, 0, 1), datetime(2024, 10, 27)),
+])
+def test_weekly(now, expected):
+    from track_schedule import weekly
+    assert weekly(6)(now) == expected
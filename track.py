@@ -35,27 +35,36 @@ from prompt_toolkit.application.current import get_app
 
 from dateutil.parser import parse, parserinfo
 import string
-import shutil
+import asyncio
 import threading
+import signal
+import functools
 import traceback
 import sys
 import logging
 from logging.handlers import TimedRotatingFileHandler
 
-from ZODB import DB, FileStorage
-from persistent import Persistent
 import transaction
 import os
 import time
 import json
 from io import StringIO
 
-import textwrap
 import re
 import __version__ as version
 
-from ruamel.yaml import YAML
-from ruamel.yaml.comments import CommentedMap
+from track_core import (
+    Tracker,
+    TrackerManager,
+    yaml,
+    settings_map,
+    page_banner,
+    wrap,
+    get_width,
+    set_width,
+)
+from track_schedule import Scheduler, every, at_midnight, weekly
+from track_backup import run_backup, backup_name, prune_backups, restore_backup, list_backups, save_current
 
 def clear_screen():
     # For Windows
@@ -65,126 +74,45 @@ def clear_screen():
     else:
         os.system('clear')
 
-# Initialize YAML object
-yaml = YAML()
-
-# Create a CommentedMap, which behaves like a Python dictionary but supports comments
-settings_map = CommentedMap({
-    'ampm': True,
-    'yearfirst': True,
-    'dayfirst': False,
-    'η': 2
-})
-# Add comments to the dictionary
-settings_map.yaml_set_comment_before_after_key('ampm', before='Track Settings\n\n[ampm] Display 12-hour times with AM or PM if true, \notherwise display 24-hour times')
-settings_map.yaml_set_comment_before_after_key('yearfirst', before='\n[yearfirst] When parsing ambiguous dates, assume the year is first if true, \notherwise assume the month is first')
-settings_map.yaml_set_comment_before_after_key('dayfirst', before='\n[dayfirst] When parsing ambiguous dates, assume the day is first if true, \notherwise assume the month is first')
-settings_map.yaml_set_comment_before_after_key('η', before='\n[η] Use this integer multiple of "spread" for setting the early-to-late \nforecast confidence interval')
-
 
+# Logging, the datastore and the Application are all set up by main() so
+# that importing this module has no side effects
+logger = logging.getLogger()
+track_home = None
+db_file = None
+backup_dir = None
 tracker_manager = None
-
-# Non-printing character
-NON_PRINTING_CHAR = '\u200B'
-# Placeholder for spaces within special tokens
-PLACEHOLDER = '\u00A0'
-# Placeholder for hyphens to prevent word breaks
-NON_BREAKING_HYPHEN = '\u2011'
-# Placeholder for zero-width non-joiner
-ZWNJ = '\u200C'
-
-# For showing active page in pages, e.g.,  ○ ○ ⏺ ○ = page 3 of 4 pages
-OPEN_CIRCLE = '○'
-CLOSED_CIRCLE = '⏺'
-# num_sigma = 'η'
-
-
-def page_banner(active_page_num: int, number_of_pages: int):
-    markers = []
-    for i in range(1, number_of_pages + 1):
-        marker = CLOSED_CIRCLE if i == active_page_num else OPEN_CIRCLE
-        markers.append(marker)
-    return ' '.join(markers)
+app = None
 
 # Backup and restore
-import zipfile
-
-# Specify the files to include in the backup
-# FIXME: just a first paso
-def backup_to_zip(track_home, today):
-    backup_dir = os.path.join(track_home, 'backup')
-    files_to_backup = [os.path.join(track_home, 'track.fs'), os.path.join(track_home, 'track.fs.index')]
-    last_modified_timestamp = os.path.getmtime(files_to_backup[0])
-    # Convert the timestamp to a human-readable format
-    last_modified_time = datetime.fromtimestamp(last_modified_timestamp)
-
-
-    for file in files_to_backup:
-        if not os.path.exists(file):
-            return (False, f"Backup skipped - {file} does not exist")
-
-    if today == 'remove':
-        files_to_backup +=  [os.path.join(track_home, 'track.fs.tmp'), os.path.join(track_home, 'track.fs.lock')]
-        backup_zip = os.path.join(track_home, 'backup', f"removed.zip")
-    else:
-        # files_to_backup = [os.path.join(track_home, 'track.fs'), os.path.join(track_home, 'track.fs.index')]
-        backup_zip = os.path.join(track_home, 'backup', f"{last_modified_time.strftime('%y%m%d')}.zip")
-        if os.path.exists(backup_zip):
-            return (False, f"Backup skipped - backup file already exists: {backup_zip}")
 
-    # print(f"backing up: {backup_dir = }, {files_to_backup = }, backup_zip = {backup_zip = }")
+# a backup must not read track.fs while a pack is replacing it
+datastore_lock = threading.Lock()
 
-    # Create a zip file and add the files
-    with zipfile.ZipFile(backup_zip, 'w') as zipf:
-        for file in files_to_backup:
-            zipf.write(file)
+def pack_datastore():
+    with datastore_lock:
+        ok, msg = tracker_manager.pack()
+    logger.info(msg)
 
 
-    if today == 'remove':
-        for fp in files_to_backup:
-            if os.path.exists(fp):
-                os.remove(fp)
-        return (True, f"Backup completed and original files removed. ")
-
-    return (True, f"Backup completed: {backup_zip}")
+def backup_datastore():
+    """
+    Back up the committed part of track.fs as backup/yymmdd.zip, named for
+    the date track.fs was last modified, unless that backup already exists.
+    """
+    name = backup_name(db_file)
+    names = list_backups(backup_dir)
+    if name in names:
+        return (False, f"Backup skipped - backup file already exists: {name}.zip")
+    return run_backup(db_file, tracker_manager.storage.getSize(), backup_dir, name, names, show_backup_progress)
 
 
 def rotate_backups(backup_dir):
-    today = datetime.today()
-    ok, msg = backup_to_zip(track_home, today)
-    if not ok:
-        logger.info(msg)
-
-    # List all files in the backup directory
-    pattern = re.compile(r'^\d{6}\.zip$')
-    all_files = os.listdir(backup_dir)
-    # Filter the files matching the regex pattern
-    # files = [f for f in all_files if pattern.match(f)]
-    names = [os.path.splitext(f)[0] for f in all_files if pattern.match(f)]
-    queue = []
-    gap = timedelta(days=14)
-
-    names.sort()
-    remove = []
-    for name in names:
-        queue.insert(0, name)
-        if len(queue) > 7:
-            pivot = queue[3]
-            older = queue[4]
-            pivot_dt = datetime.strptime(pivot, "%y%m%d")
-            pivot_gap = (pivot_dt - gap).strftime("%y%m%d")
-            if older < pivot_gap:
-                remove.append(queue.pop(-1))
-            else:
-                remove.append(queue.pop(3))
-
-            if len(queue) > 7:
-                remove.extend(queue[7:])
-                queue = queue[:7]
+    with datastore_lock:
+        ok, msg = backup_datastore()
+    logger.info(msg)
+    remove = prune_backups(backup_dir)
     if remove:
-        for name in remove:
-            file = os.path.join(backup_dir, f"{name}.zip")
-            os.remove(os.path.join(backup_dir, file))
         logger.info(f"Removing backup: {', '.join(remove)}")
 
 def restore_from_zip(track_home):
@@ -193,23 +121,23 @@ def restore_from_zip(track_home):
     print(f"""
  Choosing one of the 'restore from' options listed below will
 
-    1) compress all track.fs* files in {track_home} into "remove.zip"
-       in {backup_dir}, overwriting "remove.zip" if it exists
+    1) compress all track.fs* files in {track_home} into "removed.zip"
+       in {backup_dir}, overwriting "removed.zip" if it exists
 
-    2) remove all track.fs* files from {track_home}
+    2) restore the file "track.fs" from the selected zip file, together
+       with the earlier zip files it extends, verify it and rebuild
+       "track.fs.index"
 
-    3) restore the files "track.fs" and "track.fs.index" from the
-       selected zip file into {track_home}
+    3) only if this succeeds, replace "track.fs" and "track.fs.index"
+       in {track_home} with the restored files
 
- Note: The file "remove.zip" will be overwritten by any subsequent
- restore operation.
+ Note: The file "removed.zip" will be overwritten by any subsequent
+ restore operation. The same restore can be made without prompts with
+ "track restore yymmdd".
 
  WARNING: Choosing an option other than "0: cancel" CANNOT BE UNDONE.
 """)
-    pattern = re.compile(r'^\d{6}\.zip$')
-    all_files = os.listdir(backup_dir)
-    names = [os.path.splitext(f)[0] for f in all_files if pattern.match(f)]
-    names.sort(reverse=True)
+    names = list_backups(backup_dir)[::-1]
 
     restore_options = {'0': 'cancel'}
     for i, name in enumerate(names, 1):
@@ -226,15 +154,12 @@ def restore_from_zip(track_home):
                 print("Restore cancelled.")
                 sys.exit()
             #  we have a valid restore option
-            # Extract the files
-            ok, msg = backup_to_zip(track_home, 'remove')
+            ok, msg = save_current(track_home)
             print(msg)
             chosen_name = restore_options[choice]
-            backup_zip = os.path.join(backup_dir, chosen_name + '.zip')
-            print(f"Extracting files from {backup_zip}")
-
-            with zipfile.ZipFile(backup_zip, 'r') as zipf:
-                zipf.extractall()
+            print(f"Restoring track.fs from {chosen_name}.zip")
+            ok, msg = restore_backup(backup_dir, chosen_name, os.path.join(track_home, 'track.fs'))
+            print(msg)
             sys.exit()
 
         else:
@@ -321,736 +246,6 @@ def setup_logging():
 
     return trackhome
 
-# make logging available globally
-track_home = setup_logging()
-logger = logging.getLogger()
-logger.info(f"track version: {version.version}; track_home: {track_home}")
-
-
-def wrap(text: str, indent: int = 3, width: int = shutil.get_terminal_size()[0] - 2):
-    # Preprocess to replace spaces within specific "@\S" patterns with PLACEHOLDER
-    text = preprocess_text(text)
-    numbered_list = re.compile(r'^\d+\.\s.*')
-
-    # Split text into paragraphs
-    paragraphs = text.split('\n')
-
-    # Wrap each paragraph
-    wrapped_paragraphs = []
-    for para in paragraphs:
-        leading_whitespace = re.match(r'^\s*', para).group()
-        initial_indent = leading_whitespace
-
-        # Determine subsequent_indent based on the first non-whitespace character
-        stripped_para = para.lstrip()
-        if stripped_para.startswith(('+', '-', '*', '%', '!', '~')):
-            subsequent_indent = initial_indent + ' ' * 2
-        elif stripped_para.startswith(('@', '&')):
-            subsequent_indent = initial_indent + ' ' * 3
-        # elif stripped_para and stripped_para[0].isdigit():
-        elif stripped_para and numbered_list.match(stripped_para):
-            subsequent_indent = initial_indent + ' ' * 3
-        else:
-            subsequent_indent = initial_indent + ' ' * indent
-
-        wrapped = textwrap.fill(
-            para,
-            initial_indent='',
-            subsequent_indent=subsequent_indent,
-            width=width)
-        wrapped_paragraphs.append(wrapped)
-
-    # Join paragraphs with newline followed by non-printing character
-    wrapped_text = ('\n' + NON_PRINTING_CHAR).join(wrapped_paragraphs)
-
-    # Postprocess to replace PLACEHOLDER and NON_BREAKING_HYPHEN back with spaces and hyphens
-    wrapped_text = postprocess_text(wrapped_text)
-
-    return wrapped_text
-
-def preprocess_text(text):
-    # Regex to find "@\S" patterns and replace spaces within the pattern with PLACEHOLDER
-    text = re.sub(r'(@\S+\s\S+)', lambda m: m.group(0).replace(' ', PLACEHOLDER), text)
-    # Replace hyphens within words with NON_BREAKING_HYPHEN
-    text = re.sub(r'(\S)-(\S)', lambda m: m.group(1) + NON_BREAKING_HYPHEN + m.group(2), text)
-    return text
-
-def postprocess_text(text):
-    text = text.replace(PLACEHOLDER, ' ')
-    text = text.replace(NON_BREAKING_HYPHEN, '-')
-    return text
-
-def unwrap(wrapped_text):
-    # Split wrapped text into paragraphs
-    paragraphs = wrapped_text.split('\n' + NON_PRINTING_CHAR)
-
-    # Replace newlines followed by spaces in each paragraph with a single space
-    unwrapped_paragraphs = []
-    for para in paragraphs:
-        unwrapped = re.sub(r'\n\s*', ' ', para)
-        unwrapped_paragraphs.append(unwrapped)
-
-    # Join paragraphs with original newlines
-    unwrapped_text = '\n'.join(unwrapped_paragraphs)
-
-    return unwrapped_text
-
-def sort_key(tracker):
-    # Sorting by None first (using doc_id as secondary sorting)
-    if tracker.next_expected_completion is None:
-        return (0, tracker.doc_id)
-    # Sorting by datetime for non-None values
-    else:
-        return (1, tracker.next_expected_completion)
-
-# Tracker
-class Tracker(Persistent):
-    max_history = 12 # depending on width, 6 rows of 2, 4 rows of 3, 3 rows of 4, 2 rows of 6
-
-    @classmethod
-    def format_dt(cls, dt: Any, long=False) -> str:
-        if not isinstance(dt, datetime):
-            return ""
-        if long:
-            return dt.strftime("%Y-%m-%d %H:%M")
-        return dt.strftime("%y%m%dT%H%M")
-
-    @classmethod
-    def td2seconds(cls, td: timedelta) -> str:
-        if not isinstance(td, timedelta):
-            return ""
-        return f"{round(td.total_seconds())}"
-
-    @classmethod
-    def format_td(cls, td: timedelta, short=False):
-        if not isinstance(td, timedelta):
-            return None
-        sign = '+' if td.total_seconds() >= 0 else '-'
-        total_seconds = abs(int(td.total_seconds()))
-        if total_seconds == 0:
-            # return '0 minutes '
-            return '0m' if short else '+0m'
-        total_seconds = abs(total_seconds)
-        try:
-            until = []
-            days = hours = minutes = 0
-            if total_seconds:
-                minutes = total_seconds // 60
-                if minutes >= 60:
-                    hours = minutes // 60
-                    minutes = minutes % 60
-                if hours >= 24:
-                    days = hours // 24
-                    hours = hours % 24
-            if days:
-                until.append(f'{days}d')
-            if hours:
-                until.append(f'{hours}h')
-            if minutes:
-                until.append(f'{minutes}m')
-            if not until:
-                until.append('0m')
-            ret = ''.join(until[:2]) if short else sign + ''.join(until)
-            return ret
-        except Exception as e:
-            logger.debug(f'{td}: {e}')
-            return ''
-
-    @classmethod
-    def format_completion(cls, completion: tuple[datetime, timedelta], long=False)->str:
-        dt, td = completion
-        return f"{cls.format_dt(dt, long=True)}, {cls.format_td(td)}"
-
-    @classmethod
-    def parse_td(cls, td:str)->tuple[bool, timedelta]:
-        """\
-        Take a period string and return a corresponding timedelta.
-        Examples:
-            parse_duration('-2w3d4h5m')= Duration(weeks=-2,days=3,hours=4,minutes=5)
-            parse_duration('1h30m') = Duration(hours=1, minutes=30)
-            parse_duration('-10m') = Duration(minutes=10)
-        where:
-            d: days
-            h: hours
-            m: minutes
-            s: seconds
-
-        >>> 3*60*60+5*60
-        11100
-        >>> parse_duration("2d-3h5m")[1]
-        Duration(days=1, hours=21, minutes=5)
-        >>> datetime(2015, 10, 15, 9, 0, tz='local') + parse_duration("-25m")[1]
-        DateTime(2015, 10, 15, 8, 35, 0, tzinfo=ZoneInfo('America/New_York'))
-        >>> datetime(2015, 10, 15, 9, 0) + parse_duration("1d")[1]
-        DateTime(2015, 10, 16, 9, 0, 0, tzinfo=ZoneInfo('UTC'))
-        >>> datetime(2015, 10, 15, 9, 0) + parse_duration("1w-2d+3h")[1]
-        DateTime(2015, 10, 20, 12, 0, 0, tzinfo=ZoneInfo('UTC'))
-        """
-
-        knms = {
-            'd': 'days',
-            'day': 'days',
-            'days': 'days',
-            'h': 'hours',
-            'hour': 'hours',
-            'hours': 'hours',
-            'm': 'minutes',
-            'minute': 'minutes',
-            'minutes': 'minutes',
-            's': 'seconds',
-            'second': 'second',
-            'seconds': 'seconds',
-        }
-
-        kwds = {
-            'days': 0,
-            'hours': 0,
-            'minutes': 0,
-            'seconds': 0,
-        }
-
-        period_regex = re.compile(r'(([+-]?)(\d+)([dhms]))+?')
-        expanded_period_regex = re.compile(r'(([+-]?)(\d+)\s(day|hour|minute|second)s?)+?')
-        logger.debug(f"parse_td: {td}")
-        m = period_regex.findall(td)
-        if not m:
-            m = expanded_period_regex.findall(str(td))
-            if not m:
-                return False, f"Invalid period string '{td}'"
-        for g in m:
-            if g[3] not in knms:
-                return False, f'Invalid period argument: {g[3]}'
-
-            num = -int(g[2]) if g[1] == '-' else int(g[2])
-            if num:
-                kwds[knms[g[3]]] = num
-        td = timedelta(**kwds)
-        return True, td
-
-
-    @classmethod
-    def parse_dt(cls, dt: str = "") -> tuple[bool, datetime]:
-        # if isinstance(dt, datetime):
-        #     return True, dt
-        if dt.strip() == "now":
-            dt = datetime.now()
-            return True, dt
-        elif isinstance(dt, str) and dt:
-            pi = parserinfo(
-                dayfirst=False,
-                yearfirst=True)
-            try:
-                dt = parse(dt, parserinfo=pi)
-                return True, dt
-            except Exception as e:
-                msg = f"Error parsing datetime: {dt}\ne {repr(e)}"
-                return False, msg
-        else:
-            return False, "Invalid datetime"
-
-    @classmethod
-    def parse_completion(cls, completion: str) -> tuple[datetime, timedelta]:
-        parts = [x.strip() for x in re.split(r',\s+', completion)]
-        dt = parts.pop(0)
-        if parts:
-            td = parts.pop(0)
-        else:
-            td = timedelta(0)
-
-        logger.debug(f"parts: {dt}, {td}")
-        msg = []
-        if not dt:
-            return False, ""
-        dtok, dt = cls.parse_dt(dt)
-        if not dtok:
-            msg.append(dt)
-        if td:
-            logger.debug(f"{td = }")
-            tdok, td = cls.parse_td(td)
-            if not tdok:
-                msg.append(td)
-        else:
-            # no td specified
-            td = timedelta(0)
-            tdok = True
-        if dtok and tdok:
-            return True, (dt, td)
-        return False, "; ".join(msg)
-
-    @classmethod
-    def parse_completions(cls, completions: List[str]) -> List[tuple[datetime, timedelta]]:
-        completions = [x.strip() for x in completions.split('; ') if x.strip()]
-        output = []
-        msg = []
-        for completion in completions:
-            ok, x = cls.parse_completion(completion)
-            if ok:
-                output.append(x)
-            else:
-                msg.append(x)
-        if msg:
-            return False, "; ".join(msg)
-        return True, output
-
-
-    def __init__(self, name: str, doc_id: int) -> None:
-        self.doc_id = int(doc_id)
-        self.name = name
-        self.history = []
-        self.created = datetime.now()
-        self.modified = self.created
-        logger.debug(f"Created tracker {self.name} ({self.doc_id})")
-
-
-    @property
-    def info(self):
-        # Lazy initialization with re-computation logic
-        if not hasattr(self, '_info') or self._info is None:
-            logger.debug(f"Computing info for {self.name} ({self.doc_id})")
-            self._info = self.compute_info()
-        return self._info
-
-    def compute_info(self):
-        # Example computation based on history, returning a dict
-        result = {}
-        if not self.history:
-            result = dict(
-                last_completion=None, num_completions=0, num_intervals=0, average_interval=timedelta(minutes=0), last_interval=timedelta(minutes=0), spread=timedelta(minutes=0), next_expected_completion=None,
-                early=None, late=None, avg=None
-                )
-        else:
-            result['last_completion'] = self.history[-1] if len(self.history) > 0 else None
-            result['num_completions'] = len(self.history)
-            result['intervals'] = []
-            result['num_intervals'] = 0
-            result['spread'] = timedelta(minutes=0)
-            result['last_interval'] = None
-            result['average_interval'] = None
-            result['next_expected_completion'] = None
-            result['early'] = None
-            result['late'] = None
-            result['avg'] = None
-            if result['num_completions'] > 0:
-                for i in range(len(self.history)-1):
-                    #                      x[i+1]                  y[i+1]               x[i]
-                    logger.debug(f"{self.history[i+1]}")
-                    result['intervals'].append(self.history[i+1][0] + self.history[i+1][1] - self.history[i][0])
-                result['num_intervals'] = len(result['intervals'])
-            if result['num_intervals'] > 0:
-                # result['last_interval'] = intervals[-1]
-                if result['num_intervals'] == 1:
-                    result['average_interval'] = result['intervals'][-1]
-                else:
-                    result['average_interval'] = sum(result['intervals'], timedelta()) / result['num_intervals']
-                result['next_expected_completion'] = result['last_completion'][0] + result['average_interval']
-                result['early'] = result['next_expected_completion'] - timedelta(days=1)
-                result['late'] = result['next_expected_completion'] + timedelta(days=1)
-                change = result['intervals'][-1] - result['average_interval']
-                direction = "↑" if change > timedelta(0) else "↓" if change < timedelta(0) else "→"
-                result['avg'] = f"{Tracker.format_td(result['average_interval'], True)}{direction}"
-                logger.debug(f"{result['avg'] = }")
-            if result['num_intervals'] >= 2:
-                total = timedelta(minutes=0)
-                for interval in result['intervals']:
-                    if interval < result['average_interval']:
-                        total += result['average_interval'] - interval
-                    else:
-                        total += interval - result['average_interval']
-                result['spread'] = total / result['num_intervals']
-            if result['num_intervals'] >= 1:
-                result['early'] = result['next_expected_completion'] - tracker_manager.settings['η'] * result['spread']
-                result['late'] = result['next_expected_completion'] + tracker_manager.settings['η'] * result['spread']
-
-        self._info = result
-        self._p_changed = True
-        # logger.debug(f"returning {result = }")
-
-        return result
-
-    # XXX: Just for reference
-    def add_to_history(self, new_event):
-        self.history.append(new_event)
-        self.modified = datetime.now()
-        self.invalidate_info()
-        self._p_changed = True  # Mark object as changed in ZODB
-
-    def format_history(self)->str:
-        output = []
-        for completion in self.history:
-            output.append(Tracker.format_completion(completion, long=True))
-        return '; '.join(output)
-
-    def invalidate_info(self):
-        # Invalidate the cached dict so it will be recomputed on next access
-        if hasattr(self, '_info'):
-            delattr(self, '_info')
-        self.compute_info()
-
-
-    def record_completion(self, completion: tuple[datetime, timedelta]):
-        ok, msg = True, ""
-        if not isinstance(completion, tuple) or len(completion) < 2:
-            completion = (completion, timedelta(0))
-        self.history.append(completion)
-        self.history.sort(key=lambda x: x[0])
-        if len(self.history) > Tracker.max_history:
-            self.history = self.history[-Tracker.max_history:]
-
-        # Notify ZODB that this object has changed
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-        return True, f"recorded completion for ..."
-
-    def rename(self, name: str):
-        self.name = name
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-
-    def record_completions(self, completions: list[tuple[datetime, timedelta]]):
-        logger.debug(f"starting {self.history = }")
-        self.history = []
-        for completion in completions:
-            if not isinstance(completion, tuple) or len(completion) < 2:
-                completion = (completion, timedelta(0))
-            self.history.append(completion)
-        self.history.sort(key=lambda x: x[0])
-        if len(self.history) > Tracker.max_history:
-            self.history = self.history[-Tracker.max_history:]
-        logger.debug(f"ending {self.history = }")
-        self.invalidate_info()
-        self.modified = datetime.now()
-        self._p_changed = True
-        return True, f"recorded completions for ..."
-
-
-    def edit_history(self):
-        if not self.history:
-            logger.debug("No history to edit.")
-            return
-
-        # Display current history
-        for i, completion in enumerate(self.history):
-            logger.debug(f"{i + 1}. {self.format_completion(completion)}")
-
-        # Choose an entry to edit
-        try:
-            choice = int(input("Enter the number of the history entry to edit (or 0 to cancel): ").strip())
-            if choice == 0:
-                return
-            if choice < 1 or choice > len(self.history):
-                print("Invalid choice.")
-                return
-            selected_comp = self.history[choice - 1]
-            print(f"Selected completion: {self.format_completion(selected_comp)}")
-
-            # Choose what to do with the selected entry
-            action = input("Do you want to (d)elete or (r)eplace this entry? ").strip().lower()
-
-            if action == 'd':
-                self.history.pop(choice - 1)
-                print("Entry deleted.")
-            elif action == 'r':
-                new_comp_str = input("Enter the replacement completion: ").strip()
-                ok, new_comp = self.parse_completion(new_comp_str)
-                if ok:
-                    self.history[choice - 1] = new_comp
-                    return True, f"Entry replaced with {self.format_completion(new_comp)}"
-                else:
-                    return False, f"{new_comp}"
-            else:
-                return False, "Invalid action."
-
-            # Sort and truncate history if necessary
-            self.history.sort()
-            if len(self.history) > self.max_history:
-                self.history = self.history[-self.max_history:]
-
-            # Notify ZODB that this object has changed
-            self.modified = datetime.now()
-            self.update_tracker_info()
-            self.invalidate_info()
-            self._p_changed = True
-
-        except ValueError:
-            print("Invalid input. Please enter a number.")
-
-    def get_tracker_info(self):
-        if not hasattr(self, '_info') or self._info is None:
-            self._info = self.compute_info()
-        logger.debug(f"{self._info = }")
-        logger.debug(f"{self._info['avg'] = }")
-        # insert a placeholder to prevent date and time from being split across multiple lines when wrapping
-        # format_str = f"%y-%m-%d{PLACEHOLDER}%H:%M"
-        logger.debug(f"{self.history = }")
-        history = [f"{Tracker.format_dt(x[0])} {Tracker.format_td(x[1])}" for x in self.history]
-        history = ', '.join(history)
-        intervals = [f"{Tracker.format_td(x)}" for x in self._info['intervals']]
-        intervals = ', '.join(intervals)
-        return wrap(f"""\
- name:        {self.name}
- doc_id:      {self.doc_id}
- created:     {Tracker.format_dt(self.created)}
- modified:    {Tracker.format_dt(self.modified)}
- completions: ({self._info['num_completions']})
-    {history}
- intervals:   ({self._info['num_intervals']})
-    {intervals}
-    average:  {self._info['avg']}
-    spread:   {Tracker.format_td(self._info['spread'], True)}
- forecast:    {Tracker.format_dt(self._info['next_expected_completion'])}
-    early:    {Tracker.format_dt(self._info.get('early', '?'))}
-    late:     {Tracker.format_dt(self._info.get('late', '?'))}
-""", 0)
-
-class TrackerManager:
-    labels = "abcdefghijklmnopqrstuvwxyz"
-
-    def __init__(self, db_path=None) -> None:
-        if db_path is None:
-            db_path = os.path.join(os.getcwd(), "tracker.fs")
-        self.db_path = db_path
-        self.trackers = {}
-        self.tag_to_id = {}
-        self.row_to_id = {}
-        self.tag_to_row = {}
-        self.id_to_times = {}
-        self.active_page = 0
-        self.storage = FileStorage.FileStorage(self.db_path)
-        self.db = DB(self.storage)
-        self.connection = self.db.open()
-        self.root = self.connection.root()
-        self.sort_by = "forecast"  # default sort order, also "latest", "name"
-        logger.debug(f"using data from\n  {self.db_path}")
-        self.load_data()
-
-    def load_data(self):
-        try:
-            if 'settings' not in self.root:
-                self.root['settings'] = settings_map
-                transaction.commit()
-            self.settings = self.root['settings']
-            if 'trackers' not in self.root:
-                self.root['trackers'] = {}
-                self.root['next_id'] = 1  # Initialize the ID counter
-                transaction.commit()
-            self.trackers = self.root['trackers']
-        except Exception as e:
-            logger.debug(f"Warning: could not load data from '{self.db_path}': {str(e)}")
-            self.trackers = {}
-
-    def restore_defaults(self):
-        self.root['settings'] = settings_map
-        self.settings = self.root['settings']
-        transaction.commit()
-        logger.info(f"Restored default settings:\n{self.settings}")
-        self.refresh_info()
-
-    def refresh_info(self):
-        for k, v in self.trackers.items():
-            v.compute_info()
-        logger.info("Refreshed tracker info.")
-
-    def set_setting(self, key, value):
-
-        if key in self.settings:
-            self.settings[key] = value
-            self.zodb_root[0] = self.settings  # Update the ZODB storage
-            transaction.commit()
-        else:
-            print(f"Setting '{key}' not found.")
-
-    def get_setting(self, key):
-        return self.settings.get(key, None)
-
-    def add_tracker(self, name: str) -> None:
-        doc_id = self.root['next_id']
-        # Create a new tracker with the current doc_id
-        tracker = Tracker(name, doc_id)
-        # Add the tracker to the trackers dictionary
-        self.trackers[doc_id] = tracker
-        # Increment the next_id for the next tracker
-        self.root['next_id'] += 1
-        # Save the updated data
-        self.save_data()
-
-        logger.debug(f"Tracker '{name}' added with ID {doc_id}")
-        return doc_id
-
-
-    def record_completion(self, doc_id: int, comp: tuple[datetime, timedelta]):
-        # dt will be a datetime
-        ok, msg = self.trackers[doc_id].record_completion(comp)
-        if not ok:
-            display_message(msg)
-            return
-        # self.trackers[doc_id].compute_info()
-        display_message(f"{self.trackers[doc_id].get_tracker_info()}", 'info')
-
-    def record_completions(self, doc_id: int, completions: list[tuple[datetime, timedelta]]):
-        ok, msg = self.trackers[doc_id].record_completions(completions)
-        if not ok:
-            display_message(msg, 'error')
-            return
-        display_message(f"{self.trackers[doc_id].get_tracker_info()}", 'info')
-
-
-    def get_tracker_data(self, doc_id: int = None):
-        if doc_id is None:
-            logger.debug("data for all trackers:")
-            for k, v in self.trackers.items():
-                logger.debug(f"   {k:2> }. {v.get_tracker_data()}")
-        elif doc_id in self.trackers:
-            logger.debug(f"data for tracker {doc_id}:")
-            logger.debug(f"   {doc_id:2> }. {self.trackers[doc_id].get_tracker_data()}")
-
-    def sort_key(self, tracker):
-        forecast_dt = tracker._info.get('next_expected_completion', None) if hasattr(tracker, '_info') else None
-        latest_dt = tracker._info.get('last_completion', None) if hasattr(tracker, '_info') else None
-        if self.sort_by == "forecast":
-            if forecast_dt:
-                return (0, forecast_dt)
-            if latest_dt:
-                return (1, latest_dt)
-            return (2, tracker.doc_id)
-        if self.sort_by == "latest":
-            if latest_dt:
-                return (1, latest_dt)
-            if forecast_dt:
-                return (2, forecast_dt)
-            return (0, tracker.doc_id)
-        elif self.sort_by == "name":
-            return (0, tracker.name)
-        elif self.sort_by == "id":
-            return (0, tracker.doc_id)
-        else: # forecast
-            if forecast_dt:
-                return (0, forecast_dt)
-            if latest_dt:
-                return (1, latest_dt)
-            return (2, tracker.doc_id)
-
-    def get_sorted_trackers(self):
-        # Extract the list of trackers
-        trackers = [v for k, v in self.trackers.items()]
-        # Sort the trackers
-        return sorted(trackers, key=self.sort_key)
-
-    def list_trackers(self):
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%y-%m-%d")
-        # width = shutil.get_terminal_size()[0]
-        name_width = shutil.get_terminal_size()[0] - 30
-        num_pages = (len(self.trackers) + 25) // 26
-        set_pages(page_banner(self.active_page + 1, num_pages))
-        banner = f"{ZWNJ} tag   forecast  η spread   latest   name\n"
-        rows = []
-        count = 0
-        start_index = self.active_page * 26
-        end_index = start_index + 26
-        sorted_trackers = self.get_sorted_trackers()
-        sigma = self.settings.get('η', 1)
-        for tracker in sorted_trackers[start_index:end_index]:
-            parts = [x.strip() for x in tracker.name.split('@')]
-            tracker_name = parts[0]
-            if len(tracker_name) > name_width:
-                tracker_name = tracker_name[:name_width - 1] + "…"
-            forecast_dt = tracker._info.get('next_expected_completion', None) if hasattr(tracker, '_info') else None
-            early = tracker._info.get('early', '') if hasattr(tracker, '_info') else ''
-            late = tracker._info.get('late', '') if hasattr(tracker, '_info') else ''
-            spread = tracker._info.get('spread', '') if hasattr(tracker, '_info') else ''
-            # spread = f"±{Tracker.format_td(spread)[1:]: <8}" if spread else f"{'~': ^8}"
-            spread = f"{Tracker.format_td(sigma*spread)[1:]: <8}" if spread else f"{'~': ^8}"
-            if tracker.history:
-                latest = tracker.history[-1][0].strftime("%y-%m-%d")
-            else:
-                latest = "~"
-            forecast = forecast_dt.strftime("%y-%m-%d") if forecast_dt else center_text("~", 8)
-            avg = tracker._info.get('avg', None) if hasattr(tracker, '_info') else None
-            interval = f"{avg: <8}" if avg else f"{'~': ^8}"
-            tag = TrackerManager.labels[count]
-            self.id_to_times[tracker.doc_id] = (early.strftime("%y-%m-%d") if early else '', late.strftime("%y-%m-%d") if late else '')
-            self.tag_to_id[(self.active_page, tag)] = tracker.doc_id
-            self.row_to_id[(self.active_page, count+1)] = tracker.doc_id
-            self.tag_to_row[(self.active_page, tag)] = count+1
-            count += 1
-            # rows.append(f" {tag}{" "*4}{forecast}{" "*2}{latest}{" "*2}{interval}{" " * 3}{tracker_name}")
-            rows.append(f" {tag}{" "*4}{forecast}{" "*2}{spread}{" "*2}{latest}{" " * 3}{tracker_name}")
-        return banner +"\n".join(rows)
-
-    def set_active_page(self, page_num):
-        if 0 <= page_num < (len(self.trackers) + 25) // 26:
-            self.active_page = page_num
-        else:
-            logger.debug("Invalid page number.")
-
-    def next_page(self):
-        self.set_active_page(self.active_page + 1)
-
-    def previous_page(self):
-        self.set_active_page(self.active_page - 1)
-
-    def first_page(self):
-        self.set_active_page(0)
-
-
-    def get_tracker_from_tag(self, tag: str):
-        pagetag = (self.active_page, tag)
-        if pagetag not in self.tag_to_id:
-            return None
-        return self.trackers[self.tag_to_id[pagetag]]
-
-    def get_tracker_from_row(self, row: int):
-        pagerow = (self.active_page, row)
-        if pagerow not in self.row_to_id:
-            return None
-        return self.trackers[self.row_to_id[pagerow]]
-
-    def save_data(self):
-        self.root['trackers'] = self.trackers
-        transaction.commit()
-
-    def update_tracker(self, doc_id, tracker):
-        self.trackers[doc_id] = tracker
-        self.save_data()
-
-    def delete_tracker(self, doc_id):
-        if doc_id in self.trackers:
-            del self.trackers[doc_id]
-            self.save_data()
-
-    def edit_tracker_history(self, label: str):
-        tracker = self.get_tracker_from_tag(label)
-        if tracker:
-            tracker.edit_history()
-            self.save_data()
-        else:
-            logger.debug(f"No tracker found corresponding to label {label}.")
-
-    def get_tracker_from_id(self, doc_id):
-        return self.trackers.get(doc_id, None)
-
-    def close(self):
-        # Make sure to commit or abort any ongoing transaction
-        print()
-        try:
-            if self.connection.transaction_manager.isDoomed():
-                logger.error("Transaction aborted.")
-                transaction.abort()
-            else:
-                logger.info("Transaction committed.")
-                transaction.commit()
-        except Exception as e:
-            logger.error(f"Error during transaction handling: {e}")
-            transaction.abort()
-        else:
-            logger.info("Transaction handled successfully.")
-        finally:
-            self.connection.close()
-
-db_file = os.path.join(track_home, "track.fs")
-backup_dir = os.path.join(track_home, "backup")
-tracker_manager = TrackerManager(db_file)
 
 tracker_style = {
     'next-warn': 'fg:darkorange',
@@ -1160,6 +355,9 @@ class HelpLexer(Lexer):
 
 class TrackerLexer(Lexer):
     _instance = None
+    line_cache_size = 26 * 4
+    # the lines tokenized, rather than taken from line_cache, for RenderStats
+    lines_lexed = 0
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -1169,81 +367,111 @@ class TrackerLexer(Lexer):
     def __init__(self):
         if not hasattr(self, '_initialized'):
             self._initialized = True
-            now = datetime.now()
-        now = datetime.now()
+            self.line_cache = {} # (line, today) -> tokens
+            # bumped by clear_cache, e.g., by new_day at midnight
+            self.generation = 0
 
     def lex_document(self, document):
         # logger.debug("lex_document called")
         active_page = tracker_manager.active_page
         lines = document.lines
+        # prompt_toolkit keeps get_line_tokens for as long as the text is
+        # unchanged, e.g., across midnight, so today is looked up again
+        # only when the cache has been cleared since
+        generation = self.generation
         now = datetime.now().strftime("%y-%m-%d")
         def get_line_tokens(line_number):
-            line = lines[line_number]
-            tokens = []
+            nonlocal generation, now
+            if generation != self.generation:
+                generation = self.generation
+                now = datetime.now().strftime("%y-%m-%d")
+            # the list is redrawn far more often than it changes, e.g., for
+            # every tick of the status clock, so reuse the tokens of lines
+            # already seen today
+            key = (lines[line_number], now)
+            tokens = self.line_cache.pop(key, None)
+            if tokens is None:
+                tokens = self.line_tokens(lines[line_number], now, active_page)
+                TrackerLexer.lines_lexed += 1
+            # re-inserting keeps the most recently used lines at the end
+            self.line_cache[key] = tokens
+            if len(self.line_cache) > self.line_cache_size:
+                del self.line_cache[next(iter(self.line_cache))]
+            return tokens
+
+        return get_line_tokens
 
-            if line and line[0] == ' ':  # does line start with a space
-                parts = line.split()
-                if len(parts) < 4:
-                    return [(tracker_style.get('default', ''), line)]
-
-                # Extract the parts of the line
-                tag, next_date, spread, last_date, tracker_name = parts[0], parts[1], parts[2], parts[3], " ".join(parts[4:])
-                id = tracker_manager.tag_to_id.get((active_page, tag), None)
-                alert, warn = tracker_manager.id_to_times.get(id, (None, None))
-
-                # Determine styles based on dates
-                if alert and warn:
-                    if now < alert:
-                        # logger.debug("fine")
-                        next_style = tracker_style.get('next-fine', '')
-                        last_style = tracker_style.get('next-fine', '')
-                        spread_style = tracker_style.get('next-fine', '')
-                        name_style = tracker_style.get('next-fine', '')
-                    elif now >= alert and now < warn:
-                        # logger.debug("alert")
-                        next_style = tracker_style.get('next-alert', '')
-                        last_style = tracker_style.get('next-alert', '')
-                        spread_style = tracker_style.get('next-alert', '')
-                        name_style = tracker_style.get('next-alert', '')
-                    elif now >= warn:
-                        # logger.debug("warn")
-                        next_style = tracker_style.get('next-warn', '')
-                        last_style = tracker_style.get('next-warn', '')
-                        spread_style = tracker_style.get('next-warn', '')
-                        name_style = tracker_style.get('next-warn', '')
-                elif next_date != "~" and next_date > now:
+    def clear_cache(self):
+        # the tags of the lines refer to the trackers of the listed page so
+        # tokenize the lines again rather than reuse their cached tokens
+        self.line_cache.clear()
+        self.generation += 1
+
+    def line_tokens(self, line: str, now: str, active_page: int):
+        tokens = []
+
+        if line and line[0] == ' ':  # does line start with a space
+            parts = line.split()
+            if len(parts) < 4:
+                return [(tracker_style.get('default', ''), line)]
+
+            # Extract the parts of the line
+            tag, next_date, spread, last_date, tracker_name = parts[0], parts[1], parts[2], parts[3], " ".join(parts[4:])
+            id = tracker_manager.tag_to_id.get((active_page, tag), None)
+            alert, warn = tracker_manager.id_to_times.get(id, (None, None))
+
+            # Determine styles based on dates
+            if alert and warn:
+                if now < alert:
+                    # logger.debug("fine")
                     next_style = tracker_style.get('next-fine', '')
                     last_style = tracker_style.get('next-fine', '')
                     spread_style = tracker_style.get('next-fine', '')
                     name_style = tracker_style.get('next-fine', '')
-                else:
-                    next_style = tracker_style.get('default', '')
-                    last_style = tracker_style.get('default', '')
-                    spread_style = tracker_style.get('default', '')
-                    name_style = tracker_style.get('default', '')
-
-                # Format each part with fixed width
-                tag_formatted = f"  {tag:<5}"          # 7 spaces for tag
-                next_formatted = f"{next_date:^8}  "  # 10 spaces for next date
-                last_formatted = f"{last_date:^8}  "  # 10 spaces for last date
-                if spread == "~":
-                    spread_formatted = f"{spread:^8}  "  # 10 spaces for freq
-                else:
-                    spread_formatted = f"{spread:^8}  "  # 10 spaces for freq
-                # Add the styled parts to the tokens list
-                tokens.append((tracker_style.get('tag', ''), tag_formatted))
-                tokens.append((next_style, next_formatted))
-                tokens.append((spread_style, spread_formatted))
-                tokens.append((last_style, last_formatted))
-                tokens.append((name_style, tracker_name))
-            elif banner_regex.match(line):
-                tokens.append((tracker_style.get('banner', ''), line))
+                elif now >= alert and now < warn:
+                    # logger.debug("alert")
+                    next_style = tracker_style.get('next-alert', '')
+                    last_style = tracker_style.get('next-alert', '')
+                    spread_style = tracker_style.get('next-alert', '')
+                    name_style = tracker_style.get('next-alert', '')
+                elif now >= warn:
+                    # logger.debug("warn")
+                    next_style = tracker_style.get('next-warn', '')
+                    last_style = tracker_style.get('next-warn', '')
+                    spread_style = tracker_style.get('next-warn', '')
+                    name_style = tracker_style.get('next-warn', '')
+            elif next_date != "~" and next_date > now:
+                next_style = tracker_style.get('next-fine', '')
+                last_style = tracker_style.get('next-fine', '')
+                spread_style = tracker_style.get('next-fine', '')
+                name_style = tracker_style.get('next-fine', '')
             else:
-                tokens.append((tracker_style.get('default', ''), line))
-            # logger.debug(f"tokens: {tokens}")
-            return tokens
+                next_style = tracker_style.get('default', '')
+                last_style = tracker_style.get('default', '')
+                spread_style = tracker_style.get('default', '')
+                name_style = tracker_style.get('default', '')
+
+            # Format each part with fixed width
+            tag_formatted = f"  {tag:<5}"          # 7 spaces for tag
+            next_formatted = f"{next_date:^8}  "  # 10 spaces for next date
+            last_formatted = f"{last_date:^8}  "  # 10 spaces for last date
+            if spread == "~":
+                spread_formatted = f"{spread:^8}  "  # 10 spaces for freq
+            else:
+                spread_formatted = f"{spread:^8}  "  # 10 spaces for freq
+            # Add the styled parts to the tokens list
+            tokens.append((tracker_style.get('tag', ''), tag_formatted))
+            tokens.append((next_style, next_formatted))
+            tokens.append((spread_style, spread_formatted))
+            tokens.append((last_style, last_formatted))
+            tokens.append((name_style, tracker_name))
+        elif banner_regex.match(line):
+            tokens.append((tracker_style.get('banner', ''), line))
+        else:
+            tokens.append((tracker_style.get('default', ''), line))
+        # logger.debug(f"tokens: {tokens}")
+        return tokens
 
-        return get_line_tokens
 
     @staticmethod
     def _parse_date(date_str):
@@ -1258,7 +486,7 @@ def get_lexer(document_type):
         return DefaultLexer()
 
 def format_statustime(obj, freq: int = 0):
-    width = shutil.get_terminal_size()[0]
+    width = get_width()
     ampm = True
     dayfirst = False
     yearfirst = True
@@ -1291,42 +519,137 @@ style = Style.from_dict({
     'status-window': f'bg:#396060 {NAMED_COLORS["White"]}',
 })
 
-def check_alarms():
-    """Periodic task to check alarms."""
-    today = (datetime.now()-timedelta(days=1)).strftime("%y-%m-%d")
-    while True:
-        f = freq  # Interval (e.g., 6, 12, 30, 60 seconds)
-        s = int(datetime.now().second)
-        n = s % f
-        w = f if n == 0 else f - n
-        time.sleep(w)  # Wait for the next interval
-        ct = datetime.now()
-        current_time = format_statustime(ct, freq)
-        message = f"{current_time}"
-        update_status(message)
-        newday = ct.strftime("%y-%m-%d")
-        if newday != today:
-            logger.debug(f"new day: {newday}")
-            today = newday
-            rotate_backups(backup_dir)
+# the progress of a running backup, shown in place of the clock's dots
+backup_status = ""
+
+def tick_status():
+    """Show the current time in the status bar."""
+    if backup_status:
+        update_status(f"{format_statustime(datetime.now())} {backup_status}")
+    else:
+        update_status(format_statustime(datetime.now(), freq))
+
+def show_backup_progress(done: int, size: int):
+    # called from the backup job's thread so the status bar itself is
+    # updated on the loop of the interface
+    global backup_status
+    backup_status = f"↻{100 * done // max(size, 1)}%" if done < size else ""
+    if app.loop is not None and not app.loop.is_closed():
+        app.loop.call_soon_threadsafe(tick_status)
+
+def new_day():
+    # the lexer colors the lines by today's date but the display area only
+    # asks for them again when it is redrawn
+    logger.debug(f"new day: {datetime.now().strftime('%y-%m-%d')}")
+    tracker_lexer.clear_cache()
+    app.invalidate()
 
 def update_status(new_message):
+    if new_message == status_control.text:
+        # nothing to redraw
+        return
     status_control.text = new_message
     app.invalidate()  # Request a UI refresh
 
+def refresh_view():
+    # make the view in the display area again without changing the mode
+    if current_view is not None:
+        tracker_lexer.clear_cache()
+        display_area.text = current_view()
+        app.invalidate()
+
+def on_resize(width: int):
+    # only the view in the display area is made again now, anything else
+    # is wrapped for the new width when it is next shown
+    if set_width(width):
+        logger.debug(f"resized to width {width}")
+        refresh_view()
+
+def sync_datastore():
+    # pick up the changes made by other processes sharing the server
+    if tracker_manager.sync():
+        logger.debug("datastore changed by another process")
+        refresh_view()
+        set_pages(page_banner(tracker_manager.active_page + 1, tracker_manager.num_pages()))
+
+def resized():
+    # the terminal was resized so look up its width, once, and redraw
+    on_resize(app.output.get_size().columns)
+    app.invalidate()
+
+async def handle_resize():
+    # prompt_toolkit sets its own SIGWINCH handler once running, after
+    # pre_run, so replace it then. The redraw that follows a change of
+    # size repaints the whole screen in any case.
+    sigwinch = getattr(signal, 'SIGWINCH', None)
+    if sigwinch is None:
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(sigwinch, resized)
+    except (ValueError, RuntimeError, NotImplementedError) as e:
+        # not in the main thread or no signals on this platform
+        logger.debug(f"not handling resizes: {e}")
+
+class RenderStats:
+    """
+    The number of frames rendered and the time spent rendering them, timed
+    from the application's before_render to its after_render events, and
+    the number of lines of the list that had to be lexed. With the list
+    unchanged, a tick of the status clock should cost a frame but no lines.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.lines_lexed = TrackerLexer.lines_lexed
+        self.started = None
+
+    def before_render(self, app):
+        self.started = time.perf_counter()
+
+    def after_render(self, app):
+        if self.started is None:
+            return
+        seconds = time.perf_counter() - self.started
+        self.started = None
+        self.frames += 1
+        self.seconds += seconds
+        self.slowest = max(self.slowest, seconds)
+
+    def log(self):
+        # called every minute by the scheduler
+        if self.frames:
+            logger.debug(f"rendered {self.frames} frames in {self.seconds * 1000:.1f} ms, {self.seconds * 1000 / self.frames:.2f} ms per frame, slowest {self.slowest * 1000:.2f} ms; lexed {TrackerLexer.lines_lexed - self.lines_lexed} lines")
+        self.reset()
+
+render_stats = RenderStats()
+
 # UI Setup
 
 def start_periodic_checks():
-    """Start the periodic check for alarms in a separate thread."""
-    threading.Thread(target=check_alarms, daemon=True).start()
-
-def center_text(text, width: int = shutil.get_terminal_size()[0] - 2):
-    if len(text) >= width:
-        return text
-    total_padding = width - len(text)
-    left_padding = total_padding // 2
-    right_padding = total_padding - left_padding
-    return ' ' * left_padding + text + ' ' * right_padding
+    """
+    Schedule the periodic jobs on the application's event loop. The backup
+    is made once at startup, as before, and then each day at midnight. The
+    datastore is packed at the start of each Monday, and at startup as well
+    if the last pack was more than a week ago. When connected to a track
+    server, the changes made by other processes are picked up instead.
+    """
+    scheduler = Scheduler()
+    scheduler.add('status', tick_status, every(freq))
+    scheduler.add('render stats', render_stats.log, every(60))
+    scheduler.add('new day', new_day, at_midnight)
+    if tracker_manager.server:
+        # the server makes the backups and packs
+        scheduler.add('sync', sync_datastore, every(freq))
+    else:
+        scheduler.add('backup', lambda: rotate_backups(backup_dir), at_midnight, blocking=True, first=datetime.now())
+        scheduler.add('pack', pack_datastore, weekly(0), blocking=True, first=datetime.now() if tracker_manager.pack_overdue() else None)
+    app.create_background_task(scheduler.run())
+    app.create_background_task(handle_resize())
 
 # all_trackers = center_text('All Trackers')
 
@@ -1426,7 +749,8 @@ dialog_container = ConditionalContainer(
 
 freq = 12
 
-status_control = FormattedTextControl(text=f"{format_statustime(datetime.now(), freq)}")
+# the time is shown once the width of the terminal is known, see build_app
+status_control = FormattedTextControl(text="")
 status_window = Window(content=status_control, height=1, style="class:status-window", width=D(preferred=20), align=WindowAlign.LEFT)
 
 page_control = FormattedTextControl(text="")
@@ -1434,7 +758,13 @@ page_window = Window(content=page_control, height=1, style="class:status-window"
 
 right_control = FormattedTextControl(text="")
 right_window = Window(content=right_control, height=1, style="class:status-window", width=D(preferred=20), align=WindowAlign.RIGHT)
-right_control.text = f"{tracker_manager.sort_by} "
+
+
+def set_right_control():
+    # the sort order and, when the list is filtered, the view and filter
+    view = f"{tracker_manager.filter_view} " if tracker_manager.filter_view else ""
+    query = f"/{tracker_manager.filter_query} " if tracker_manager.filter_query else ""
+    right_control.text = f"{view}{query}{tracker_manager.sort_by} "
 
 
 def set_pages(txt: str):
@@ -1467,7 +797,9 @@ def get_tracker_from_row()->int:
         tracker = None
     return tracker
 
+@functools.lru_cache(maxsize=1)
 def read_readme():
+    # read once, the help is shown from this copy thereafter
     try:
         with open("README.md", "r") as file:
             return file.read()
@@ -1595,15 +927,20 @@ def do_restore_defaults(*event):
 @kb.add('f7')
 def do_help(*event):
     help_text = read_readme()
-    display_message(wrap(help_text, 0), 'help')
+    display_message(wrap(help_text, 0), 'help', lambda: wrap(help_text, 0))
 
 @kb.add('c-q')
 def exit_app(*event):
     """Exit the application."""
     app.exit()
 
-def display_message(message: str, document_type: str = 'list'):
-    """Log messages to the text area."""
+# makes the text in the display area again, if it depends upon the width
+current_view = None
+
+def display_message(message: str, document_type: str = 'list', view: Callable[[], str] = None):
+    """Log messages to the text area. Pass view if message should be made again for a new width."""
+    global current_view
+    current_view = view
     set_lexer(document_type)
     display_area.text = message
     message_control.text = ""
@@ -1614,10 +951,20 @@ def list_trackers(*event):
     """List trackers."""
     action[0] = "list"
     set_mode('menu')
-    display_message(tracker_manager.list_trackers(), 'list')
+    tracker_lexer.clear_cache()
+    display_message(tracker_manager.list_trackers(), 'list', tracker_manager.list_trackers)
+    set_pages(page_banner(tracker_manager.active_page + 1, tracker_manager.num_pages()))
     app.layout.focus(display_area)
     app.invalidate()
 
+def display_tracker_info(doc_id: int, ok: bool, msg: str):
+    """Show the info for doc_id after a change or the reason it failed."""
+    if ok:
+        tracker = tracker_manager.trackers[doc_id]
+        display_message(tracker.get_tracker_info(), 'info', tracker.get_tracker_info)
+    else:
+        display_message(msg, 'error')
+
 # # @kb.add('S', filter=Condition(lambda: menu_mode[0]))
 # def list_settings(*event):
 #     """List settings."""
@@ -1721,6 +1068,7 @@ def add_example_trackers(*event):
         tracker = Tracker(name, doc_id)
         # Add the tracker to the trackers dictionary
         tracker_manager.trackers[doc_id] = tracker
+        tracker_manager.name_index.add(doc_id, name)
         # doc_id =tracker_manager.add_tracker(f"# {lm.sentence()[:-1]}") # remove period at end and record for doc_id i+1
         num_completions = random.choice(range(0,9,2))
         days = random.choice(range(1,12))
@@ -1731,6 +1079,8 @@ def add_example_trackers(*event):
             comp = today - offset
             tracker_manager.trackers[doc_id].record_completion(comp)
         tracker_manager.trackers[doc_id].compute_info()
+        tracker_manager.reindex(tracker)
+    tracker_manager.save_data()
     list_trackers()
 
 @kb.add('c-r')
@@ -1788,6 +1138,9 @@ class Dialog:
     def set_app(self, app):
         self.app = app
 
+    def set_tracker_manager(self, tracker_manager):
+        self.tracker_manager = tracker_manager
+
     def set_done_keys(self, done_keys: list[str]):
         self.done_keys = done_keys
 
@@ -1813,9 +1166,15 @@ class Dialog:
         elif self.action_type == "settings":
             self.set_input_mode(None)
 
+        elif self.action_type == "filter":
+            self.set_input_mode(None)
+
         elif self.action_type == "sort":
             self.set_sort_mode(None)
 
+        elif self.action_type == "view":
+            self.set_view_mode(None)
+
 
     def set_input_mode(self, tracker):
         set_mode('input')
@@ -1850,7 +1209,7 @@ class Dialog:
         elif self.action_type == "inspect":
             set_mode('menu')
             tracker = tracker_manager.get_tracker_from_id(self.selected_id)
-            display_message(tracker.get_tracker_info(), 'info')
+            display_message(tracker.get_tracker_info(), 'info', tracker.get_tracker_info)
             app.layout.focus(display_area)
 
         elif self.action_type == "settings":
@@ -1880,6 +1239,14 @@ class Dialog:
             self.kb.add('enter')(self.handle_new)
             self.kb.add('escape', eager=True)(self.handle_cancel)
 
+        elif self.action_type == "filter":
+            self.message_control.text = wrap(" List only the trackers whose names have words beginning with each of the words entered, e.g., 'fee @ho' for 'Fill feeders @home'. Leave empty to list all the trackers.\n Press 'enter' to apply or '^c' to cancel", 0)
+            input_area.text = self.tracker_manager.filter_query
+            self.app.layout.focus(input_area)
+            input_area.accept_handler = lambda buffer: self.handle_filter()
+            self.kb.add('enter')(self.handle_filter)
+            self.kb.add('c-c', eager=True)(self.handle_cancel)
+
         elif self.action_type == "delete":
             self.message_control.text = f'Are you sure you want to delete "{tracker.name}" (doc_id {self.selected_id}) (Y/n)?'
             self.set_bool_mode()
@@ -1891,10 +1258,19 @@ class Dialog:
 
     def set_sort_mode(self, event=None):
         set_mode('character')
+        action[0] = self.action_type
         self.message_control.text = wrap(f" Sort by f)orecast, l)atest, n)ame or i)d", 0)
         self.set_done_keys(['f', 'l', 'n', 'i', 'escape'])
         for key in self.done_keys:
-            self.kb.add(key, filter=Condition(lambda: character_mode[0]), eager=True)(lambda event, key=key: self.handle_sort(event, key))
+            self.kb.add(key, filter=Condition(lambda: character_mode[0] and action[0] == self.action_type), eager=True)(lambda event, key=key: self.handle_sort(event, key))
+
+    def set_view_mode(self, event=None):
+        set_mode('character')
+        action[0] = self.action_type
+        self.message_control.text = wrap(f" Show the trackers that are o)verdue, due t)oday, due this w)eek or a)ll the trackers", 0)
+        self.set_done_keys(['o', 't', 'w', 'a', 'escape'])
+        for key in self.done_keys:
+            self.kb.add(key, filter=Condition(lambda: character_mode[0] and action[0] == self.action_type), eager=True)(lambda event, key=key: self.handle_view(event, key))
 
     def handle_key_press(self, event, key_pressed):
         logger.debug(f"{key_pressed = }")
@@ -1929,7 +1305,8 @@ class Dialog:
             ok, completion = Tracker.parse_completion(completion_str)
             if ok:
                 logger.debug(f"recording completion_dt: '{completion}' for {self.selected_id}")
-                self.tracker_manager.record_completion(self.selected_id, completion)
+                ok, msg = self.tracker_manager.record_completion(self.selected_id, completion)
+                display_tracker_info(self.selected_id, ok, msg)
                 close_dialog()
         else:
             self.display_area.text = "No completion datetime provided."
@@ -1943,7 +1320,8 @@ class Dialog:
             ok, completions = Tracker.parse_completions(history)
             if ok:
                 logger.debug(f"recording '{completions}' for {self.selected_id}")
-                self.tracker_manager.record_completions(self.selected_id, completions)
+                ok, msg = self.tracker_manager.record_completions(self.selected_id, completions)
+                display_tracker_info(self.selected_id, ok, msg)
                 close_dialog()
             else:
                 display_message(f"Invalid history: '{completions}'", 'error')
@@ -1971,7 +1349,7 @@ class Dialog:
         name_str = input_area.text.strip()
         logger.debug(f"got name_str: '{name_str}' for {self.selected_id}")
         if name_str:
-            self.tracker_manager.trackers[self.selected_id].rename(name_str)
+            self.tracker_manager.rename_tracker(self.selected_id, name_str)
             logger.debug(f"recorded new name: '{name_str}' for {self.selected_id}")
             close_dialog()
         else:
@@ -1990,8 +1368,12 @@ class Dialog:
             # Step 2: Update the original CommentedMap with the new data
             # This will overwrite only the changed values while keeping the structure.
             self.tracker_manager.settings.update(updated_settings)
+            # the settings map is not persistent so flag its container
+            self.tracker_manager.root._p_changed = True
             transaction.commit()
             logger.debug(f"updated settings:\n{yaml_string}")
+            # η and window both change the forecasts
+            self.tracker_manager.refresh_info()
             close_dialog()
         set_mode('menu')
         list_trackers()
@@ -2034,6 +1416,7 @@ class Dialog:
     def handle_sort(self, event=None, key_pressed=None):
         if key_pressed in self.done_keys:
             if key_pressed == 'escape':
+                action[0] = ""
                 set_mode('menu')
                 return
             if key_pressed == 'f':
@@ -2044,10 +1427,31 @@ class Dialog:
                 self.tracker_manager.sort_by = 'name'
             elif key_pressed == 'i':
                 self.tracker_manager.sort_by = 'id'
-            right_control.text = f"{self.tracker_manager.sort_by} "
+            set_right_control()
+            list_trackers()
+            self.app.layout.focus(self.display_area)
+
+    def handle_view(self, event=None, key_pressed=None):
+        if key_pressed in self.done_keys:
+            if key_pressed == 'escape':
+                action[0] = ""
+                set_mode('menu')
+                return
+            views = {'o': 'overdue', 't': 'today', 'w': 'week', 'a': None}
+            self.tracker_manager.set_view(views[key_pressed])
+            set_right_control()
             list_trackers()
             self.app.layout.focus(self.display_area)
 
+    def handle_filter(self, event=None):
+        self.tracker_manager.set_filter(input_area.text)
+        logger.debug(f"filtering trackers by '{self.tracker_manager.filter_query}'")
+        close_dialog()
+        set_right_control()
+        set_mode('menu')
+        list_trackers()
+        self.app.layout.focus(self.display_area)
+
     def handle_cancel(self, event=None, key_pressed=None):
         if key_pressed == 'escape':
             set_mode('menu')
@@ -2080,6 +1484,12 @@ kb.add('d', filter=Condition(lambda: menu_mode[0]))(dialog_delete.start_dialog)
 dialog_sort = Dialog("sort", kb, tag_keys, bool_keys, tracker_manager, message_control, display_area, wrap)
 kb.add('s', filter=Condition(lambda: menu_mode[0]))(dialog_sort.start_dialog)
 
+dialog_view = Dialog("view", kb, tag_keys, bool_keys, tracker_manager, message_control, display_area, wrap)
+kb.add('v', filter=Condition(lambda: menu_mode[0]))(dialog_view.start_dialog)
+
+dialog_filter = Dialog("filter", kb, tag_keys, bool_keys, tracker_manager, message_control, display_area, wrap)
+kb.add('f', filter=Condition(lambda: menu_mode[0]))(dialog_filter.start_dialog)
+
 
 body = HSplit([
     # menu_container,
@@ -2110,6 +1520,8 @@ root_container = MenuContainer(
             children=[
                 MenuItem('i) inspect tracker', handler=lambda: dialog_inspect.start_dialog(None)),
                 MenuItem('l) list trackers', handler=list_trackers),
+                MenuItem('v) view overdue or due soon', handler=lambda: dialog_view.start_dialog(None)),
+                MenuItem('f) filter trackers by name', handler=lambda: dialog_filter.start_dialog(None)),
                 MenuItem('s) sort trackers', handler=lambda: dialog_sort.start_dialog(None)),
                 MenuItem('t) select row from tag', handler=select_tag),
             ]
@@ -2128,32 +1540,50 @@ root_container = MenuContainer(
 )
 
 layout = Layout(root_container)
-# app = Application(layout=layout, key_bindings=kb, full_screen=True, style=style)
 
-app = Application(layout=layout, key_bindings=kb, full_screen=True, mouse_support=True, style=style)
+def build_app():
+    """Create the Application for tracker_manager, which must already be open."""
+    global app
+    # app = Application(layout=layout, key_bindings=kb, full_screen=True, style=style)
+    app = Application(layout=layout, key_bindings=kb, full_screen=True, mouse_support=True, style=style)
+    set_width(app.output.get_size().columns)
+    tick_status()
+    app.before_render += render_stats.before_render
+    app.after_render += render_stats.after_render
 
-app.layout.focus(root_container.body)
+    app.layout.focus(root_container.body)
+    set_right_control()
 
-for dialog in [dialog_new, dialog_complete, dialog_delete, dialog_edit, dialog_sort, dialog_rename, dialog_inspect, dialog_settings]:
-    dialog.set_app(app)
-
-# dialog_new.set_app(app)
-# dialog_complete.set_app(app)
-# dialog_delete.set_app(app)
+    for dialog in [dialog_new, dialog_complete, dialog_delete, dialog_edit, dialog_sort, dialog_view, dialog_filter, dialog_rename, dialog_inspect, dialog_settings]:
+        dialog.set_app(app)
+        dialog.set_tracker_manager(tracker_manager)
+    return app
 
 def main():
-    # global tracker_manager
+    global track_home, db_file, backup_dir, tracker_manager
+    track_home = setup_logging()
+    logger.info(f"track version: {version.version}; track_home: {track_home}")
+    db_file = os.path.join(track_home, "track.fs")
+    backup_dir = os.path.join(track_home, "backup")
+    try:
+        tracker_manager = TrackerManager(db_file)
+    except Exception as e:
+        logger.error(f"could not open {db_file}: {e}")
+        print(f"Could not open {db_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+    build_app()
     try:
         logger.info(f"Started TrackerManager with database file {db_file}")
         display_text = tracker_manager.list_trackers()
         display_message(display_text)
-        start_periodic_checks()  # Start the periodic checks
-        app.run()
+        set_pages(page_banner(tracker_manager.active_page + 1, tracker_manager.num_pages()))
+        app.run(pre_run=start_periodic_checks)
     except Exception as e:
         logger.error(f"exception raised:\n{e}")
     else:
         logger.error("exited tracker")
     finally:
+        print()
         if tracker_manager:
             tracker_manager.close()
             logger.info(f"Closed TrackerManager and database file {db_file}")
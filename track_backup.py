@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Backups of the datastore made in a worker process.
+
+FileStorage only ever appends to track.fs, and storage.getSize() is the
+end of the last committed transaction, so the first getSize() bytes of
+track.fs are a consistent copy of the datastore even while later
+transactions are being appended. These bytes are read in chunks and
+deflated into a zip file by a separate process so that neither the
+compression nor the disk I/O stalls the interface. The index,
+track.fs.index, is not included since FileStorage rebuilds it from
+track.fs when it is missing.
+
+Between packs, the bytes already in the last backup never change, so most
+backups are incremental and hold only the bytes appended since then as
+'track.fs.part'. Every backup also holds a manifest.json recording
+
+    kind:    'full' or 'incremental'
+    base:    the name of the backup this one extends, None when full
+    start:   the offset in track.fs of the first byte backed up
+    end:     the offset just past the last byte backed up
+    tail:    the sha256 of the tail_size bytes of track.fs before end
+    sha256:  the sha256 of the bytes backed up
+    chain:   the number of incremental backups since the last full one
+
+The next backup is incremental only when track.fs is at least end bytes
+long and the tail_size bytes before end still match tail. After a pack
+they won't and a full backup is made instead. A full backup is also made
+once max_chain incremental backups have accumulated so that restoring
+never needs more than max_chain + 1 backups. Restoring a backup writes
+its full ancestor and then appends each incremental backup of the chain
+in order.
+
+The number of bytes written so far is shared with the parent process so
+that the progress can be shown in the status bar.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from datetime import datetime, timedelta
+from typing import Callable
+
+logger = logging.getLogger()
+
+ARCNAME = 'track.fs'
+PART_ARCNAME = 'track.fs.part'
+MANIFEST = 'manifest.json'
+CHUNK_SIZE = 1 << 20
+tail_size = 4096
+max_chain = 6
+
+
+def backup_path(backup_dir: str, name: str) -> str:
+    return os.path.join(backup_dir, f"{name}.zip")
+
+
+def read_manifest(backup_zip: str) -> dict:
+    """
+    Return the manifest of backup_zip or None for a backup made before
+    manifests were added.
+    """
+    try:
+        with zipfile.ZipFile(backup_zip) as zipf:
+            return json.loads(zipf.read(MANIFEST))
+    except (KeyError, OSError, ValueError, zipfile.BadZipFile):
+        return None
+
+
+def tail_hash(db_file: str, end: int) -> str:
+    with open(db_file, 'rb') as f:
+        start = max(end - tail_size, 0)
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def plan_backup(db_file: str, size: int, backup_dir: str, names: list[str]) -> tuple[int, str, int]:
+    """
+    Return (start, base, chain) for a backup of the first size bytes of
+    db_file, given the names of the existing backups in order: start and
+    base are 0 and None when a full backup is needed.
+    """
+    if not names:
+        return 0, None, 0
+    base = names[-1]
+    manifest = read_manifest(backup_path(backup_dir, base))
+    if (manifest is None or manifest['chain'] >= max_chain or manifest['end'] > size
+            or tail_hash(db_file, manifest['end']) != manifest['tail']):
+        return 0, None, 0
+    return manifest['end'], base, manifest['chain'] + 1
+
+
+def write_backup(db_file: str, start: int, end: int, backup_zip: str, manifest: dict, progress=None) -> None:
+    """
+    Deflate bytes start to end of db_file into backup_zip, as ARCNAME when
+    start is 0 and otherwise as PART_ARCNAME, followed by manifest with the
+    hashes filled in. progress.value is set to the number of bytes done
+    after each chunk. The zip file is written under a temporary name and
+    only renamed when complete so an interrupted backup never leaves a
+    partial backup_zip.
+    """
+    date_time = time.localtime(os.path.getmtime(db_file))[:6]
+    info = zipfile.ZipInfo(ARCNAME if start == 0 else PART_ARCNAME, date_time=date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    digest = hashlib.sha256()
+    # the last tail_size bytes up to end, which may reach back before start
+    tail = b''
+    if start > 0:
+        with open(db_file, 'rb') as f:
+            f.seek(max(start - tail_size, 0))
+            tail = f.read(start - max(start - tail_size, 0))
+    tmp = backup_zip + '.tmp'
+    with open(db_file, 'rb') as src, zipfile.ZipFile(tmp, 'w') as zipf:
+        src.seek(start)
+        with zipf.open(info, 'w', force_zip64=True) as dest:
+            done = 0
+            while done < end - start:
+                chunk = src.read(min(CHUNK_SIZE, end - start - done))
+                if not chunk:
+                    break
+                dest.write(chunk)
+                digest.update(chunk)
+                tail = (tail + chunk)[-tail_size:]
+                done += len(chunk)
+                if progress is not None:
+                    progress.value = done
+        manifest = dict(manifest, tail=hashlib.sha256(tail).hexdigest(), sha256=digest.hexdigest())
+        zipf.writestr(zipfile.ZipInfo(MANIFEST, date_time=date_time), json.dumps(manifest, indent=1))
+    os.replace(tmp, backup_zip)
+
+
+def run_backup(db_file: str, size: int, backup_dir: str, name: str, names: list[str], report: Callable[[int, int], None] = None, interval: float = 0.5) -> tuple[bool, str]:
+    """
+    Back up the first size bytes of db_file as name in backup_dir in a
+    worker process, incrementally if possible given the names of the
+    existing backups in order, calling report(done, total) every interval
+    seconds while it runs. This blocks until the worker finishes so it
+    should itself be called off the event loop.
+    """
+    started = time.perf_counter()
+    backup_zip = backup_path(backup_dir, name)
+    start, base, chain = plan_backup(db_file, size, backup_dir, names)
+    if base is not None and start == size:
+        return False, f"Backup skipped - no changes since {base}"
+    manifest = dict(
+        kind='full' if base is None else 'incremental',
+        base=base,
+        start=start,
+        end=size,
+        chain=chain,
+        created=datetime.now().isoformat(timespec='seconds'),
+    )
+    # spawn rather than fork since the interface has threads of its own
+    context = multiprocessing.get_context('spawn')
+    progress = context.Value('q', 0)
+    worker = context.Process(target=write_backup, args=(db_file, start, size, backup_zip, manifest, progress), daemon=True)
+    worker.start()
+    while worker.is_alive():
+        worker.join(interval)
+        if report is not None:
+            report(progress.value, size - start)
+    if worker.exitcode != 0:
+        return False, f"Backup failed with exit code {worker.exitcode}: {backup_zip}"
+    elapsed = time.perf_counter() - started
+    return True, f"Backup completed: {backup_zip}, {manifest['kind']} with {size - start} bytes compressed to {os.path.getsize(backup_zip)} in {elapsed:.2f} seconds"
+
+
+def backup_chain(backup_dir: str, name: str) -> list[str]:
+    """
+    Return the names of the backups needed to restore name, starting with
+    its full ancestor and ending with name itself.
+    """
+    chain = [name]
+    manifest = read_manifest(backup_path(backup_dir, name))
+    while manifest is not None and manifest['base'] is not None:
+        chain.insert(0, manifest['base'])
+        manifest = read_manifest(backup_path(backup_dir, manifest['base']))
+    return chain
+
+
+def list_backups(backup_dir: str) -> list[str]:
+    # the names, yymmdd, of the backups from oldest to newest
+    pattern = re.compile(r'^\d{6}\.zip$')
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(backup_dir) if pattern.match(f))
+
+
+def backup_name(db_file: str) -> str:
+    # backups are named for the date db_file was last modified
+    return datetime.fromtimestamp(os.path.getmtime(db_file)).strftime('%y%m%d')
+
+
+def prune_backups(backup_dir: str) -> list[str]:
+    """
+    Remove all but 7 of the backups in backup_dir, the 3 most recent and 4
+    older ones separated by intervals of at least 14 days, together with
+    any the kept backups extend, and return the names of those removed.
+    """
+    names = list_backups(backup_dir)
+    queue = []
+    gap = timedelta(days=14)
+
+    names.sort()
+    remove = []
+    for name in names:
+        queue.insert(0, name)
+        if len(queue) > 7:
+            pivot = queue[3]
+            older = queue[4]
+            pivot_dt = datetime.strptime(pivot, "%y%m%d")
+            pivot_gap = (pivot_dt - gap).strftime("%y%m%d")
+            if older < pivot_gap:
+                remove.append(queue.pop(-1))
+            else:
+                remove.append(queue.pop(3))
+
+            if len(queue) > 7:
+                remove.extend(queue[7:])
+                queue = queue[:7]
+    # an incremental backup is useless without the backups it extends
+    needed = set()
+    for name in queue:
+        needed.update(backup_chain(backup_dir, name))
+    remove = [name for name in remove if name not in needed]
+    for name in remove:
+        os.remove(backup_path(backup_dir, name))
+    return remove
+
+
+def save_current(track_home: str) -> tuple[bool, str]:
+    """
+    Save the track.fs* files in track_home as backup/removed.zip,
+    overwriting any earlier removed.zip, before they are replaced by a
+    restore.
+    """
+    files = [x for x in sorted(os.listdir(track_home)) if x.startswith('track.fs')]
+    if not files:
+        return True, f"No track.fs files in {track_home} to save"
+    removed_zip = os.path.join(track_home, 'backup', 'removed.zip')
+    with zipfile.ZipFile(removed_zip, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+        for file in files:
+            zipf.write(os.path.join(track_home, file), file)
+    return True, f"Saved {', '.join(files)} as {removed_zip}"
+
+
+def extract_link(backup_zip: str, manifest: dict, dest) -> None:
+    """
+    Append the bytes held by backup_zip to dest, checking that they start
+    where dest ends and match the sha256 in manifest. zipfile itself checks
+    the CRC of each member as it is read. Raises ValueError if a check fails.
+    """
+    if manifest['start'] != dest.tell():
+        raise ValueError(f"{backup_zip} starts at {manifest['start']} rather than {dest.tell()}")
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(backup_zip) as zipf:
+        arcname = ARCNAME if manifest['start'] == 0 else PART_ARCNAME
+        if arcname not in zipf.namelist():
+            # earlier backups stored track.fs under its full path
+            arcname = next((x for x in zipf.namelist() if os.path.basename(x) == ARCNAME), arcname)
+        with zipf.open(arcname) as src:
+            while chunk := src.read(CHUNK_SIZE):
+                digest.update(chunk)
+                dest.write(chunk)
+    if 'sha256' in manifest and digest.hexdigest() != manifest['sha256']:
+        raise ValueError(f"{backup_zip} does not match its sha256 checksum")
+    if 'end' in manifest and dest.tell() != manifest['end']:
+        raise ValueError(f"{backup_zip} ends at {dest.tell()} rather than {manifest['end']}")
+
+
+def build_index(db_file: str) -> None:
+    """
+    Open db_file as a FileStorage, which reads every transaction record to
+    build the index and fails if any of them is damaged, and close it again,
+    which saves the index as db_file + '.index'.
+    """
+    from ZODB.FileStorage import FileStorage
+    FileStorage(db_file).close()
+
+
+def restore_backup(backup_dir: str, name: str, db_file: str) -> tuple[bool, str]:
+    """
+    Reassemble track.fs from the chain of backups ending with name, verify
+    it and, only if that succeeds, replace db_file and its index with it.
+
+    The chain is streamed from the zip files into a temporary file beside
+    db_file, checking the CRC and sha256 of each link and that the links
+    are contiguous. FileStorage then builds the index of the temporary file,
+    which also checks every transaction record, and the file and its index
+    are renamed into place. Nothing is changed if any check fails.
+    """
+    from zc.lockfile import LockFile, LockError
+    started = time.perf_counter()
+    chain = backup_chain(backup_dir, name)
+    tmp = db_file + '.restore'
+    try:
+        # make sure no other track process has db_file open
+        lock = LockFile(db_file + '.lock')
+    except LockError:
+        return False, f"Restore failed - {db_file} is in use by another process"
+    try:
+        with open(tmp, 'wb') as dest:
+            for link in chain:
+                backup_zip = backup_path(backup_dir, link)
+                if not os.path.exists(backup_zip):
+                    raise ValueError(f"{backup_zip}, needed to restore {name}, is missing")
+                extract_link(backup_zip, read_manifest(backup_zip) or dict(start=0), dest)
+            size = dest.tell()
+        extracted = time.perf_counter()
+        build_index(tmp)
+        indexed = time.perf_counter()
+        os.replace(tmp + '.index', db_file + '.index')
+        os.replace(tmp, db_file)
+    except Exception as e:
+        logger.info(f"restore of {name} failed: {e}")
+        return False, f"Restore failed - {e}"
+    finally:
+        lock.close()
+        for suffix in ['', '.index', '.lock', '.tmp']:
+            if os.path.exists(tmp + suffix):
+                os.remove(tmp + suffix)
+    msg = f"Restored {db_file}, {size} bytes, from {', '.join(chain)}: extracted and verified in {extracted - started:.2f} seconds, indexed in {indexed - extracted:.2f} seconds"
+    logger.info(msg)
+    return True, msg
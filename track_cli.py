@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Headless commands for track. These open the datastore, apply any change
+in a single transaction and exit without importing prompt_toolkit, so they
+are quick enough for cron jobs and scripts:
+
+    track record <doc_id> <completion>
+    track list [--json] [--sort forecast|latest|name|id] [--due overdue|today|week]
+    track search <words> [--json] [--sort forecast|latest|name|id]
+    track import <file> [--format csv|jsonl] [--batch-size N]
+    track restore [yymmdd|latest]
+    track serve
+
+Each command also accepts --home to specify the home directory, otherwise
+TRACKHOME or the current working directory is used just as for the
+interface. Everything after the doc_id of 'record', other than --home,
+is the completion so that negative adjustments such as '-1h' are not taken
+for options. Any other arguments start the interface in track.py.
+
+While 'track serve' runs, the other commands and the interface share the
+datastore through it, see track_server.py.
+"""
+import argparse
+import json
+import os
+import sys
+
+from track_core import Tracker, TrackerManager, ZWNJ, get_width
+
+commands = ['record', 'list', 'search', 'import', 'restore', 'serve']
+
+
+def get_track_home(home: str = None) -> str:
+    return home or os.environ.get('TRACKHOME') or os.getcwd()
+
+
+def do_record(tracker_manager: TrackerManager, args) -> tuple[bool, str]:
+    tracker = tracker_manager.get_tracker_from_id(args.doc_id)
+    if tracker is None:
+        return False, f"No tracker with doc_id {args.doc_id}"
+    ok, completion = Tracker.parse_completion(' '.join(args.completion))
+    if not ok:
+        return False, completion or "No completion datetime provided."
+    ok, msg = tracker_manager.record_completion(args.doc_id, completion)
+    if not ok:
+        return False, msg
+    return True, f"Recorded {Tracker.format_completion(completion)} for {tracker.name} ({tracker.doc_id})"
+
+
+def format_trackers(tracker_manager: TrackerManager, trackers: list, as_json: bool = False) -> str:
+    if as_json:
+        return json.dumps([tracker.get_tracker_data() for tracker in trackers], indent=1, ensure_ascii=False)
+    name_width = get_width() - 30
+    sigma = tracker_manager.settings.get('η', 1)
+    rows = [f"{ZWNJ}   id   forecast  η spread   latest   name"]
+    for tracker in trackers:
+        row, times = tracker_manager.format_row(tracker, name_width, sigma)
+        rows.append(f"{tracker.doc_id: >5}{row[1:]}")
+    return "\n".join(rows)
+
+
+def do_list(tracker_manager: TrackerManager, args) -> tuple[bool, str]:
+    tracker_manager.sort_by = args.sort
+    tracker_manager.set_view(args.due)
+    return True, format_trackers(tracker_manager, tracker_manager.get_sorted_trackers(), args.json)
+
+
+def do_search(tracker_manager: TrackerManager, args) -> tuple[bool, str]:
+    tracker_manager.sort_by = args.sort
+    query = ' '.join(args.words)
+    trackers = tracker_manager.search(query)
+    if not trackers and not args.json:
+        return False, f"No trackers match '{query}'"
+    return True, format_trackers(tracker_manager, trackers, args.json)
+
+
+def do_import(tracker_manager: TrackerManager, args) -> tuple[bool, str]:
+    from track_import import import_completions
+    try:
+        return import_completions(tracker_manager, args.file, args.format, args.batch_size)
+    except OSError as e:
+        return False, f"Could not read {args.file}: {e}"
+
+
+def do_restore(track_home: str, args) -> tuple[bool, str]:
+    # restore replaces track.fs so, unlike the other commands, it is given
+    # the home directory rather than an open TrackerManager
+    from track_backup import backup_chain, list_backups, read_manifest, backup_path, restore_backup, save_current
+    backup_dir = os.path.join(track_home, 'backup')
+    names = list_backups(backup_dir) if os.path.isdir(backup_dir) else []
+    if not names:
+        return False, f"No backups in {backup_dir}"
+    if args.name is None:
+        rows = []
+        for name in reversed(names):
+            manifest = read_manifest(backup_path(backup_dir, name)) or {}
+            rows.append(f"{name}  {manifest.get('kind', 'full'): <11}  {manifest.get('end', ''): >12}  {'+'.join(backup_chain(backup_dir, name))}")
+        return True, "\n".join(rows)
+    name = names[-1] if args.name == 'latest' else args.name
+    if name not in names:
+        return False, f"No backup {name} in {backup_dir}"
+    ok, msg = save_current(track_home)
+    if not ok:
+        return False, msg
+    return restore_backup(backup_dir, name, os.path.join(track_home, "track.fs"))
+
+
+def do_serve(track_home: str, args) -> tuple[bool, str]:
+    # like restore, serve opens track.fs itself
+    import logging
+    from track_server import Server
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    backup_dir = os.path.join(track_home, 'backup')
+    os.makedirs(backup_dir, exist_ok=True)
+    return Server(os.path.join(track_home, "track.fs"), backup_dir).run()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--home', help="the track home directory")
+    parser = argparse.ArgumentParser(prog='track', description="Record, list, search, import, restore and serve track data without the interface.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', parents=[common], help="record a completion for a tracker")
+    record.add_argument('doc_id', type=int, help="the doc_id of the tracker")
+    # REMAINDER so that an adjustment like '-1h' is part of the completion
+    record.add_argument('completion', nargs=argparse.REMAINDER, help="a datetime and, optionally, a comma and a timedelta, e.g., '3p, -1h'; everything after doc_id")
+    record.set_defaults(func=do_record)
+
+    list_ = subparsers.add_parser('list', parents=[common], help="list the trackers")
+    list_.add_argument('--json', action='store_true', help="print the trackers as json")
+    list_.add_argument('--sort', default='forecast', choices=['forecast', 'latest', 'name', 'id'])
+    list_.add_argument('--due', choices=TrackerManager.due_views, help="list only the trackers that are overdue, due today or due this week")
+    list_.set_defaults(func=do_list)
+
+    search = subparsers.add_parser('search', parents=[common], help="list the trackers whose names match words")
+    search.add_argument('words', nargs='+', help="each word must begin a word of the name, e.g., 'fee @ho' for 'Fill feeders @home'")
+    search.add_argument('--json', action='store_true', help="print the trackers as json")
+    search.add_argument('--sort', default='forecast', choices=['forecast', 'latest', 'name', 'id'])
+    search.set_defaults(func=do_search)
+
+    import_ = subparsers.add_parser('import', parents=[common], help="import completions from a CSV or JSON-lines file")
+    import_.add_argument('file', help="the file to import or '-' for stdin")
+    import_.add_argument('--format', choices=['csv', 'jsonl'], help="the format of file, by default from its extension")
+    import_.add_argument('--batch-size', type=int, default=100000, help="the number of completions to commit at a time")
+    import_.set_defaults(func=do_import)
+
+    restore = subparsers.add_parser('restore', parents=[common], help="list the backups or restore the datastore from one of them")
+    restore.add_argument('name', nargs='?', help="the backup to restore, yymmdd or 'latest', or omit to list the backups")
+    restore.set_defaults(func=do_restore)
+
+    serve = subparsers.add_parser('serve', parents=[common], help="serve the datastore so that several track processes can share it")
+    serve.set_defaults(func=do_serve)
+    return parser
+
+
+def main(argv: list[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in commands:
+        # start the interface
+        import track
+        track.main()
+        return
+
+    args = get_parser().parse_args(argv)
+    if args.command == 'record' and '--home' in args.completion[:-1]:
+        # the completion is the remainder of argv so take --home back out
+        i = args.completion.index('--home')
+        args.home = args.completion[i + 1]
+        del args.completion[i:i + 2]
+    if args.command in ['restore', 'serve']:
+        ok, msg = args.func(get_track_home(args.home), args)
+        print(msg, file=sys.stdout if ok else sys.stderr)
+        sys.exit(0 if ok else 1)
+
+    db_file = os.path.join(get_track_home(args.home), "track.fs")
+    try:
+        tracker_manager = TrackerManager(db_file)
+    except Exception as e:
+        print(f"Could not open {db_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        ok, msg = args.func(tracker_manager, args)
+    finally:
+        tracker_manager.close()
+    print(msg, file=sys.stdout if ok else sys.stderr)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
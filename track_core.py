@@ -0,0 +1,1466 @@
+#!/usr/bin/env python3
+"""
+Trackers and the TrackerManager that keeps them in a ZODB datastore.
+
+Nothing here depends upon prompt_toolkit so this module can be used by
+the headless commands in track_cli.py as well as by the interface in
+track.py.
+"""
+from typing import List, Dict, Any, Callable, Mapping
+from datetime import datetime, timedelta, date
+from dateutil.parser import parse
+import shutil
+import logging
+
+# ZODB's FileStorage and BTrees take most of the time needed to import this
+# module and are only needed once a TrackerManager opens a datastore so they
+# are imported there
+from persistent import Persistent
+import transaction
+import os
+import time
+
+import textwrap
+import functools
+import re
+import bisect
+from collections import Counter
+from array import array
+
+from track_parse import (
+    ISO_DT_REGEX,
+    COMPACT_DT_REGEX,
+    get_parserinfo,
+    parse_td as parse_duration,
+    split_completion,
+    split_completions,
+)
+
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap
+
+# numpy is optional and slow to import so it is only imported by
+# compute_info_batch when first needed
+np = None
+
+logger = logging.getLogger()
+
+# Initialize YAML object
+yaml = YAML()
+
+# Create a CommentedMap, which behaves like a Python dictionary but supports comments
+settings_map = CommentedMap({
+    'ampm': True,
+    'yearfirst': True,
+    'dayfirst': False,
+    'η': 2,
+    'window': 12,
+    'pack_days': 30,
+})
+# Add comments to the dictionary
+settings_map.yaml_set_comment_before_after_key('ampm', before='Track Settings\n\n[ampm] Display 12-hour times with AM or PM if true, \notherwise display 24-hour times')
+settings_map.yaml_set_comment_before_after_key('yearfirst', before='\n[yearfirst] When parsing ambiguous dates, assume the year is first if true, \notherwise assume the month is first')
+settings_map.yaml_set_comment_before_after_key('dayfirst', before='\n[dayfirst] When parsing ambiguous dates, assume the day is first if true, \notherwise assume the month is first')
+settings_map.yaml_set_comment_before_after_key('η', before='\n[η] Use this integer multiple of "spread" for setting the early-to-late \nforecast confidence interval')
+settings_map.yaml_set_comment_before_after_key('window', before='\n[window] Use this number of the most recent completions for computing \nthe average interval, spread and forecast. All completions are kept')
+settings_map.yaml_set_comment_before_after_key('pack_days', before='\n[pack_days] When the datastore is packed each week, keep the changes \nmade in this number of days so that they can still be undone. Use 0 \nto never pack the datastore')
+
+# Non-printing character
+NON_PRINTING_CHAR = '\u200B'
+# Placeholder for spaces within special tokens
+PLACEHOLDER = '\u00A0'
+# Placeholder for hyphens to prevent word breaks
+NON_BREAKING_HYPHEN = '\u2011'
+# Placeholder for zero-width non-joiner
+ZWNJ = '\u200C'
+
+# For showing active page in pages, e.g.,  ○ ○ ⏺ ○ = page 3 of 4 pages
+OPEN_CIRCLE = '○'
+CLOSED_CIRCLE = '⏺'
+# num_sigma = 'η'
+
+
+def page_banner(active_page_num: int, number_of_pages: int):
+    markers = []
+    for i in range(1, number_of_pages + 1):
+        marker = CLOSED_CIRCLE if i == active_page_num else OPEN_CIRCLE
+        markers.append(marker)
+    return ' '.join(markers)
+
+
+NUMBERED_LIST_REGEX = re.compile(r'^\d+\.\s.*')
+LEADING_WHITESPACE_REGEX = re.compile(r'^\s*')
+AT_PATTERN_REGEX = re.compile(r'(@\S+\s\S+)')
+HYPHEN_REGEX = re.compile(r'(\S)-(\S)')
+
+# The width of the terminal. This is sampled once, when first needed, and
+# thereafter the interface updates it with set_width when the terminal is
+# resized, so rendering never needs to ask the terminal for its size.
+terminal_width = None
+
+def get_width() -> int:
+    global terminal_width
+    if terminal_width is None:
+        terminal_width = shutil.get_terminal_size()[0]
+    return terminal_width
+
+def set_width(width: int) -> bool:
+    # return True if the width has changed
+    global terminal_width
+    changed = width != terminal_width
+    terminal_width = width
+    return changed
+
+def wrap(text: str, indent: int = 3, width: int = None):
+    # the same text is often wrapped again, e.g., the help each time it is
+    # shown, so only wrap it anew when the text, indent or width changes
+    return _wrap(text, indent, width or get_width() - 2)
+
+@functools.lru_cache(maxsize=64)
+def _wrap(text: str, indent: int, width: int):
+    # Preprocess to replace spaces within specific "@\S" patterns with PLACEHOLDER
+    text = preprocess_text(text)
+
+    # Split text into paragraphs
+    paragraphs = text.split('\n')
+
+    # Wrap each paragraph
+    wrapped_paragraphs = []
+    for para in paragraphs:
+        leading_whitespace = LEADING_WHITESPACE_REGEX.match(para).group()
+        initial_indent = leading_whitespace
+
+        # Determine subsequent_indent based on the first non-whitespace character
+        stripped_para = para.lstrip()
+        if stripped_para.startswith(('+', '-', '*', '%', '!', '~')):
+            subsequent_indent = initial_indent + ' ' * 2
+        elif stripped_para.startswith(('@', '&')):
+            subsequent_indent = initial_indent + ' ' * 3
+        # elif stripped_para and stripped_para[0].isdigit():
+        elif stripped_para and NUMBERED_LIST_REGEX.match(stripped_para):
+            subsequent_indent = initial_indent + ' ' * 3
+        else:
+            subsequent_indent = initial_indent + ' ' * indent
+
+        wrapped = textwrap.fill(
+            para,
+            initial_indent='',
+            subsequent_indent=subsequent_indent,
+            width=width)
+        wrapped_paragraphs.append(wrapped)
+
+    # Join paragraphs with newline followed by non-printing character
+    wrapped_text = ('\n' + NON_PRINTING_CHAR).join(wrapped_paragraphs)
+
+    # Postprocess to replace PLACEHOLDER and NON_BREAKING_HYPHEN back with spaces and hyphens
+    wrapped_text = postprocess_text(wrapped_text)
+
+    return wrapped_text
+
+def preprocess_text(text):
+    # Regex to find "@\S" patterns and replace spaces within the pattern with PLACEHOLDER
+    text = AT_PATTERN_REGEX.sub(lambda m: m.group(0).replace(' ', PLACEHOLDER), text)
+    # Replace hyphens within words with NON_BREAKING_HYPHEN
+    text = HYPHEN_REGEX.sub(lambda m: m.group(1) + NON_BREAKING_HYPHEN + m.group(2), text)
+    return text
+
+def postprocess_text(text):
+    text = text.replace(PLACEHOLDER, ' ')
+    text = text.replace(NON_BREAKING_HYPHEN, '-')
+    return text
+
+def unwrap(wrapped_text):
+    # Split wrapped text into paragraphs
+    paragraphs = wrapped_text.split('\n' + NON_PRINTING_CHAR)
+
+    # Replace newlines followed by spaces in each paragraph with a single space
+    unwrapped_paragraphs = []
+    for para in paragraphs:
+        unwrapped = re.sub(r'\n\s*', ' ', para)
+        unwrapped_paragraphs.append(unwrapped)
+
+    # Join paragraphs with original newlines
+    unwrapped_text = '\n'.join(unwrapped_paragraphs)
+
+    return unwrapped_text
+
+def center_text(text, width: int = None):
+    width = width or get_width() - 2
+    if len(text) >= width:
+        return text
+    total_padding = width - len(text)
+    left_padding = total_padding // 2
+    right_padding = total_padding - left_padding
+    return ' ' * left_padding + text + ' ' * right_padding
+
+
+def sort_key(tracker):
+    # Sorting by None first (using doc_id as secondary sorting)
+    if tracker.next_expected_completion is None:
+        return (0, tracker.doc_id)
+    # Sorting by datetime for non-None values
+    else:
+        return (1, tracker.next_expected_completion)
+
+WORD_REGEX = re.compile(r'\w+')
+
+# bytes of the objects read from a track server kept in memory by each client
+client_cache_size = 64 << 20
+
+def persistent_cache_size() -> int:
+    """
+    The bytes of the client cache to keep in the home directory between
+    runs, given in MB by the environmental variable TRACKCACHE. Without it
+    the cache is only kept in memory.
+    """
+    try:
+        return max(int(os.environ.get('TRACKCACHE') or 0), 0) << 20
+    except ValueError:
+        logger.info(f"ignoring TRACKCACHE={os.environ['TRACKCACHE']}, expected a number of MB")
+        return 0
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+# Tracker
+class Tracker(Persistent):
+    default_window = 12 # completions used for forecasts when the 'window' setting is missing
+    settings = settings_map # replaced by the datastore's settings when a TrackerManager loads them
+
+    @classmethod
+    def window(cls) -> int:
+        # at least two completions are needed for an interval
+        return max(int(cls.settings.get('window', cls.default_window)), 2)
+
+    @classmethod
+    def dt2seconds(cls, dt: datetime) -> int:
+        # whole seconds since the epoch of a naive local datetime, aware
+        # datetimes are converted to local time first
+        if dt.tzinfo is not None:
+            dt = dt.astimezone().replace(tzinfo=None)
+        return (dt - EPOCH) // SECOND
+
+    @classmethod
+    def seconds2dt(cls, seconds: int) -> datetime:
+        return EPOCH + timedelta(seconds=seconds)
+
+    @classmethod
+    def format_dt(cls, dt: Any, long=False) -> str:
+        if not isinstance(dt, datetime):
+            return ""
+        if long:
+            return dt.strftime("%Y-%m-%d %H:%M")
+        return dt.strftime("%y%m%dT%H%M")
+
+    @classmethod
+    def td2seconds(cls, td: timedelta) -> str:
+        if not isinstance(td, timedelta):
+            return ""
+        return f"{round(td.total_seconds())}"
+
+    @classmethod
+    def format_td(cls, td: timedelta, short=False):
+        if not isinstance(td, timedelta):
+            return None
+        sign = '+' if td.total_seconds() >= 0 else '-'
+        total_seconds = abs(int(td.total_seconds()))
+        if total_seconds == 0:
+            # return '0 minutes '
+            return '0m' if short else '+0m'
+        total_seconds = abs(total_seconds)
+        try:
+            until = []
+            days = hours = minutes = 0
+            if total_seconds:
+                minutes = total_seconds // 60
+                if minutes >= 60:
+                    hours = minutes // 60
+                    minutes = minutes % 60
+                if hours >= 24:
+                    days = hours // 24
+                    hours = hours % 24
+            if days:
+                until.append(f'{days}d')
+            if hours:
+                until.append(f'{hours}h')
+            if minutes:
+                until.append(f'{minutes}m')
+            if not until:
+                until.append('0m')
+            ret = ''.join(until[:2]) if short else sign + ''.join(until)
+            return ret
+        except Exception as e:
+            logger.debug(f'{td}: {e}')
+            return ''
+
+    @classmethod
+    def format_completion(cls, completion: tuple[datetime, timedelta], long=False)->str:
+        dt, td = completion
+        return f"{cls.format_dt(dt, long=True)}, {cls.format_td(td)}"
+
+    @classmethod
+    def parse_td(cls, td:str)->tuple[bool, timedelta]:
+        """
+        Take a period string such as '+1d' or '-2h30m' and return (True,
+        timedelta) or (False, msg). Parsed strings are cached.
+        """
+        return parse_duration(td)
+
+
+    @classmethod
+    def parse_dt(cls, dt: str = "") -> tuple[bool, datetime]:
+        # if isinstance(dt, datetime):
+        #     return True, dt
+        dt = dt.strip()
+        if dt == "now":
+            dt = datetime.now()
+            return True, dt
+        elif isinstance(dt, str) and dt:
+            # these formats are unambiguous so yearfirst and dayfirst don't
+            # apply, an invalid date is left for dateutil to report
+            try:
+                if ISO_DT_REGEX.match(dt):
+                    return True, datetime.fromisoformat(dt)
+                m = COMPACT_DT_REGEX.match(dt)
+                if m:
+                    year, month, day, hour, minute = m.groups()
+                    return True, datetime(get_parserinfo(False, True).convertyear(int(year)), int(month), int(day), int(hour), int(minute))
+            except ValueError:
+                pass
+            pi = get_parserinfo(
+                bool(cls.settings.get('dayfirst', False)),
+                bool(cls.settings.get('yearfirst', True)))
+            try:
+                dt = parse(dt, parserinfo=pi)
+                return True, dt
+            except Exception as e:
+                msg = f"Error parsing datetime: {dt}\ne {repr(e)}"
+                return False, msg
+        else:
+            return False, "Invalid datetime"
+
+    @classmethod
+    def parse_completion(cls, completion: str) -> tuple[datetime, timedelta]:
+        dt, td = split_completion(completion)
+
+        msg = []
+        if not dt:
+            return False, ""
+        dtok, dt = cls.parse_dt(dt)
+        if not dtok:
+            msg.append(dt)
+        if td:
+            tdok, td = cls.parse_td(td)
+            if not tdok:
+                msg.append(td)
+        else:
+            # no td specified
+            td = timedelta(0)
+            tdok = True
+        if dtok and tdok:
+            return True, (dt, td)
+        return False, "; ".join(msg)
+
+    @classmethod
+    def parse_completions(cls, completions: List[str]) -> List[tuple[datetime, timedelta]]:
+        completions = split_completions(completions)
+        output = []
+        msg = []
+        for completion in completions:
+            ok, x = cls.parse_completion(completion)
+            if ok:
+                output.append(x)
+            else:
+                msg.append(x)
+        if msg:
+            return False, "; ".join(msg)
+        return True, output
+
+
+    def __init__(self, name: str, doc_id: int) -> None:
+        self.doc_id = int(doc_id)
+        self.name = name
+        # The history of completions is kept as two packed arrays of whole
+        # seconds, the completion datetimes since the epoch and the offsets,
+        # which cost 16 bytes per completion to pickle.
+        self.times = array('q')
+        self.offsets = array('q')
+        self.created = datetime.now()
+        self.modified = self.created
+        logger.debug(f"Created tracker {self.name} ({self.doc_id})")
+
+
+    def _p_resolveConflict(self, old: dict, saved: dict, new: dict) -> dict:
+        """
+        Merge the changes made to this tracker at the same time by two
+        processes sharing a track server, given the states before either
+        change (old), as committed by the first (saved) and as the second
+        would commit it (new). The completions added or removed by new are
+        added to or removed from saved. A rename by either is kept but
+        renames by both to different names are a conflict.
+        """
+        from ZODB.POSException import ConflictError
+        if any('times' not in state for state in (old, saved, new)):
+            # not yet migrated to packed arrays
+            raise ConflictError
+        name = saved['name']
+        if new['name'] != old['name']:
+            if name not in (old['name'], new['name']):
+                raise ConflictError
+            name = new['name']
+        def completions(state) -> Counter:
+            return Counter(zip(state['times'], state['offsets']))
+        merged = completions(saved)
+        merged.subtract(completions(old) - completions(new))
+        merged.update(completions(new) - completions(old))
+        pairs = sorted(merged.elements())
+        resolved = dict(saved)
+        resolved.update(
+            name=name,
+            times=array('q', [x[0] for x in pairs]),
+            offsets=array('q', [x[1] for x in pairs]),
+            modified=max(saved['modified'], new['modified']),
+        )
+        return resolved
+
+    def __setstate__(self, state):
+        # earlier versions pickled the computed info along with the tracker
+        state.pop('_info', None)
+        # and kept the history as a list of (datetime, timedelta) tuples
+        history = state.pop('history', None)
+        super().__setstate__(state)
+        if history is not None:
+            self.set_history(history)
+
+    @property
+    def history(self) -> list[tuple[datetime, timedelta]]:
+        return self.recent(len(self.times))
+
+    @history.setter
+    def history(self, completions: list[tuple[datetime, timedelta]]):
+        self.set_history(completions)
+
+    def set_history(self, completions: list[tuple[datetime, timedelta]]):
+        completions = sorted(completions, key=lambda x: x[0])
+        self.times = array('q', [Tracker.dt2seconds(dt) for dt, td in completions])
+        self.offsets = array('q', [td // SECOND for dt, td in completions])
+
+    def completion(self, i: int) -> tuple[datetime, timedelta]:
+        return (Tracker.seconds2dt(self.times[i]), timedelta(seconds=self.offsets[i]))
+
+    def recent(self, num: int) -> list[tuple[datetime, timedelta]]:
+        # the last num completions
+        start = max(len(self.times) - num, 0)
+        return [self.completion(i) for i in range(start, len(self.times))]
+
+    @property
+    def info(self):
+        # The computed info is derived from the history and so is kept in a
+        # volatile attribute which ZODB never writes to the datastore. It is
+        # recomputed on first use after the tracker is loaded.
+        if getattr(self, '_v_info', None) is None:
+            logger.debug(f"Computing info for {self.name} ({self.doc_id})")
+            self._v_info = self.compute_info()
+        return self._v_info
+
+    @classmethod
+    def compute_stats(cls, history: list[tuple[datetime, timedelta]]) -> tuple[list, timedelta, timedelta]:
+        """
+        Return the intervals for history together with their average and
+        spread, the mean absolute deviation of the intervals from their
+        average. average is None without intervals and spread is None
+        without at least two intervals.
+        """
+        intervals = []
+        for i in range(len(history)-1):
+            #                      x[i+1]                  y[i+1]               x[i]
+            intervals.append(history[i+1][0] + history[i+1][1] - history[i][0])
+        average = spread = None
+        if len(intervals) == 1:
+            average = intervals[-1]
+        elif intervals:
+            average = sum(intervals, timedelta()) / len(intervals)
+        if len(intervals) >= 2:
+            spread = sum((abs(interval - average) for interval in intervals), timedelta()) / len(intervals)
+        return intervals, average, spread
+
+    def info_from_stats(self, intervals: list, average: timedelta, spread: timedelta, total: timedelta = None):
+        # the running total of the intervals lets update_info adjust the
+        # average without summing the intervals again
+        self._v_total = total if total is not None else sum(intervals, timedelta())
+        result = {}
+        if not self.times:
+            result = dict(
+                last_completion=None, num_completions=0, num_intervals=0, average_interval=timedelta(minutes=0), last_interval=timedelta(minutes=0), spread=timedelta(minutes=0), next_expected_completion=None,
+                early=None, late=None, avg=None
+                )
+        else:
+            result['last_completion'] = self.completion(-1)
+            result['num_completions'] = len(self.times)
+            result['intervals'] = intervals
+            result['num_intervals'] = len(intervals)
+            result['spread'] = spread if spread is not None else timedelta(minutes=0)
+            result['last_interval'] = None
+            result['average_interval'] = average
+            result['next_expected_completion'] = None
+            result['early'] = None
+            result['late'] = None
+            result['avg'] = None
+            if result['num_intervals'] > 0:
+                result['next_expected_completion'] = result['last_completion'][0] + result['average_interval']
+                change = result['intervals'][-1] - result['average_interval']
+                direction = "↑" if change > timedelta(0) else "↓" if change < timedelta(0) else "→"
+                result['avg'] = f"{Tracker.format_td(result['average_interval'], True)}{direction}"
+                result['early'] = result['next_expected_completion'] - Tracker.settings['η'] * result['spread']
+                result['late'] = result['next_expected_completion'] + Tracker.settings['η'] * result['spread']
+
+        self._v_info = result
+        return result
+
+    def compute_info(self):
+        return self.info_from_stats(*self.compute_stats(self.recent(Tracker.window())))
+
+    def update_info(self):
+        """
+        Update the cached info after a completion has been appended to the
+        end of the history. Only the new interval is computed, the interval
+        that slides out of the window is dropped and the average comes from
+        the running total. The spread still needs a pass over the intervals
+        but there are never more than the window of these.
+        """
+        info = self._v_info
+        window = Tracker.window()
+        previous = min(len(self.times) - 1, window)
+        if len(info.get('intervals', [])) != max(previous - 1, 0):
+            # the window setting has changed since the info was computed
+            return self.compute_info()
+        evicted = 1 if previous == window else 0
+        last, new = self.completion(-2), self.completion(-1)
+        interval = new[0] + new[1] - last[0]
+        intervals = info['intervals'] + [interval]
+        dropped = intervals[:evicted]
+        intervals = intervals[evicted:]
+        total = self._v_total + interval - sum(dropped, timedelta())
+        average = intervals[-1] if len(intervals) == 1 else total / len(intervals)
+        spread = None
+        if len(intervals) >= 2:
+            spread = sum((abs(x - average) for x in intervals), timedelta()) / len(intervals)
+        return self.info_from_stats(intervals, average, spread, total)
+
+    # XXX: Just for reference
+    def add_to_history(self, new_event):
+        self.record_completion(new_event)
+
+    def format_history(self)->str:
+        output = []
+        for completion in self.history:
+            output.append(Tracker.format_completion(completion, long=True))
+        return '; '.join(output)
+
+    def invalidate_info(self):
+        # Invalidate the cached dict so it will be recomputed on next access
+        self._v_info = None
+
+
+    def record_completion(self, completion: tuple[datetime, timedelta]):
+        ok, msg = True, ""
+        if not isinstance(completion, tuple) or len(completion) < 2:
+            completion = (completion, timedelta(0))
+        seconds = Tracker.dt2seconds(completion[0])
+        # the usual case: the completion is later than any in the history
+        in_order = bool(self.times) and seconds >= self.times[-1]
+        i = bisect.bisect_right(self.times, seconds)
+        self.times.insert(i, seconds)
+        self.offsets.insert(i, completion[1] // SECOND)
+
+        if in_order and getattr(self, '_v_info', None) is not None:
+            self.update_info()
+        else:
+            self.invalidate_info()
+        # Notify ZODB that this object has changed
+        self.modified = datetime.now()
+        self._p_changed = True
+        return True, f"recorded completion for ..."
+
+    def rename(self, name: str):
+        self.name = name
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+
+    def record_completions(self, completions: list[tuple[datetime, timedelta]]):
+        logger.debug(f"starting with {len(self.times)} completions")
+        history = []
+        for completion in completions:
+            if not isinstance(completion, tuple) or len(completion) < 2:
+                completion = (completion, timedelta(0))
+            history.append(completion)
+        self.set_history(history)
+        logger.debug(f"ending with {len(self.times)} completions")
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+        return True, f"recorded completions for ..."
+
+    def merge_completions(self, times: array, offsets: array):
+        """
+        Add completions, given as packed arrays of seconds like self.times
+        and self.offsets, to the history. When they are all later than the
+        current history, as when importing in order, the arrays are simply
+        extended, otherwise the combined history is sorted.
+        """
+        in_order = all(times[i] <= times[i+1] for i in range(len(times) - 1))
+        if in_order and (not self.times or not times or times[0] >= self.times[-1]):
+            self.times.extend(times)
+            self.offsets.extend(offsets)
+        else:
+            pairs = sorted(zip(self.times + times, self.offsets + offsets), key=lambda x: x[0])
+            self.times = array('q', [x[0] for x in pairs])
+            self.offsets = array('q', [x[1] for x in pairs])
+        self.invalidate_info()
+        self.modified = datetime.now()
+        self._p_changed = True
+
+
+    def edit_history(self):
+        history = self.history
+        if not history:
+            logger.debug("No history to edit.")
+            return
+
+        # Display current history
+        for i, completion in enumerate(history):
+            logger.debug(f"{i + 1}. {self.format_completion(completion)}")
+
+        # Choose an entry to edit
+        try:
+            choice = int(input("Enter the number of the history entry to edit (or 0 to cancel): ").strip())
+            if choice == 0:
+                return
+            if choice < 1 or choice > len(history):
+                print("Invalid choice.")
+                return
+            selected_comp = history[choice - 1]
+            print(f"Selected completion: {self.format_completion(selected_comp)}")
+
+            # Choose what to do with the selected entry
+            action = input("Do you want to (d)elete or (r)eplace this entry? ").strip().lower()
+
+            if action == 'd':
+                history.pop(choice - 1)
+                print("Entry deleted.")
+            elif action == 'r':
+                new_comp_str = input("Enter the replacement completion: ").strip()
+                ok, new_comp = self.parse_completion(new_comp_str)
+                if ok:
+                    history[choice - 1] = new_comp
+                    self.set_history(history)
+                    self.modified = datetime.now()
+                    self.invalidate_info()
+                    return True, f"Entry replaced with {self.format_completion(new_comp)}"
+                else:
+                    return False, f"{new_comp}"
+            else:
+                return False, "Invalid action."
+
+            # set_history sorts the history
+            self.set_history(history)
+
+            # Notify ZODB that this object has changed
+            self.modified = datetime.now()
+            self.invalidate_info()
+            self._p_changed = True
+
+        except ValueError:
+            print("Invalid input. Please enter a number.")
+
+    def get_tracker_data(self) -> dict:
+        # the info as plain values for json: datetimes as ISO strings and
+        # timedeltas as seconds
+        info = self.info
+        last = info.get('last_completion')
+        isoformat = lambda dt: dt.isoformat() if isinstance(dt, datetime) else None
+        seconds = lambda td: round(td.total_seconds()) if isinstance(td, timedelta) else None
+        return dict(
+            doc_id=self.doc_id,
+            name=self.name,
+            num_completions=info['num_completions'],
+            latest=isoformat(last[0]) if last else None,
+            average=seconds(info['average_interval']),
+            spread=seconds(info['spread']),
+            forecast=isoformat(info['next_expected_completion']),
+            early=isoformat(info['early']),
+            late=isoformat(info['late']),
+            )
+
+    def get_tracker_info(self):
+        info = self.info
+        logger.debug(f"{info = }")
+        # insert a placeholder to prevent date and time from being split across multiple lines when wrapping
+        # format_str = f"%y-%m-%d{PLACEHOLDER}%H:%M"
+        # only the completions in the window used for the forecast
+        recent = self.recent(Tracker.window())
+        logger.debug(f"{recent = }")
+        history = [f"{Tracker.format_dt(x[0])} {Tracker.format_td(x[1])}" for x in recent]
+        history = ', '.join(history)
+        if len(recent) < len(self.times):
+            history = f"last {len(recent)}: {history}"
+        intervals = [f"{Tracker.format_td(x)}" for x in info.get('intervals', [])]
+        intervals = ', '.join(intervals)
+        return wrap(f"""\
+ name:        {self.name}
+ doc_id:      {self.doc_id}
+ created:     {Tracker.format_dt(self.created)}
+ modified:    {Tracker.format_dt(self.modified)}
+ completions: ({info['num_completions']})
+    {history}
+ intervals:   ({info['num_intervals']})
+    {intervals}
+    average:  {info['avg']}
+    spread:   {Tracker.format_td(info['spread'], True)}
+ forecast:    {Tracker.format_dt(info['next_expected_completion'])}
+    early:    {Tracker.format_dt(info.get('early', '?'))}
+    late:     {Tracker.format_dt(info.get('late', '?'))}
+""", 0)
+
+def _divide(totals, counts):
+    # numpy version of timedelta division: round to the nearest microsecond
+    # with ties going to the even quotient
+    quotients, remainders = np.divmod(totals, counts)
+    twice = 2 * remainders
+    return quotients + ((twice > counts) | ((twice == counts) & (quotients % 2 == 1)))
+
+def _batch_stats(trackers: list):
+    """
+    Return (intervals, average, spread) for each tracker, as in
+    Tracker.compute_stats, with the arithmetic for all the trackers done at
+    once on numpy arrays of int64 microseconds.
+    """
+    # the completions in each tracker's window, straight from the packed
+    # arrays of seconds
+    window = Tracker.window()
+    times = [np.frombuffer(tracker.times, dtype=np.int64)[-window:] for tracker in trackers]
+    offsets = [np.frombuffer(tracker.offsets, dtype=np.int64)[-window:] for tracker in trackers]
+    counts = np.fromiter((len(x) for x in times), dtype=np.int64, count=len(times))
+    total = int(counts.sum())
+    times = np.concatenate(times) * 1_000_000 if total else np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate(offsets) * 1_000_000 if total else np.zeros(0, dtype=np.int64)
+
+    # intervals between consecutive completions, dropping the pairs that
+    # straddle two trackers
+    num_intervals = np.maximum(counts - 1, 0)
+    same_tracker = np.ones(max(total - 1, 0), dtype=bool)
+    ends = np.cumsum(counts)[counts > 0] - 1
+    same_tracker[ends[ends < total - 1]] = False
+    intervals = (times[1:] + offsets[1:] - times[:-1])[same_tracker]
+
+    firsts = np.cumsum(num_intervals) - num_intervals
+    cumulative = np.concatenate(([0], np.cumsum(intervals)))
+    has_intervals = num_intervals > 0
+    divisors = np.where(has_intervals, num_intervals, 1)
+    averages = _divide(cumulative[firsts + num_intervals] - cumulative[firsts], divisors)
+    deviations = np.abs(intervals - np.repeat(averages, num_intervals))
+    cumulative = np.concatenate(([0], np.cumsum(deviations)))
+    spreads = _divide(cumulative[firsts + num_intervals] - cumulative[firsts], divisors)
+
+    # back to lists of timedelta
+    intervals = intervals.view('timedelta64[us]').tolist()
+    averages = averages.view('timedelta64[us]').tolist()
+    spreads = spreads.view('timedelta64[us]').tolist()
+    stats = []
+    for first, num, average, spread in zip(firsts.tolist(), num_intervals.tolist(), averages, spreads):
+        stats.append((intervals[first:first + num], average if num else None, spread if num >= 2 else None))
+    return stats
+
+def compute_info_batch(trackers: list):
+    """
+    Compute the info for all the trackers at once using numpy when it is
+    available, otherwise tracker by tracker. Either way the results are
+    identical to those of Tracker.compute_info.
+    """
+    global np
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            pass
+    if np is None or not trackers:
+        return [tracker.compute_info() for tracker in trackers]
+    return [tracker.info_from_stats(*stats) for tracker, stats in zip(trackers, _batch_stats(trackers))]
+
+class SortedIndex:
+    """
+    A list of (key, doc_id) entries kept in order with bisect. Updating the
+    position of a single tracker is a binary search and a list insert rather
+    than a full re-sort, and a page is just a slice of the entries.
+    """
+
+    def __init__(self, key: Callable, trackers: Mapping) -> None:
+        self.key = key
+        self.entry_for_id = {tracker.doc_id: (key(tracker), tracker.doc_id) for tracker in trackers.values()}
+        self.entries = sorted(self.entry_for_id.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, tracker):
+        entry = (self.key(tracker), tracker.doc_id)
+        self.entry_for_id[tracker.doc_id] = entry
+        bisect.insort(self.entries, entry)
+
+    def remove(self, doc_id: int):
+        entry = self.entry_for_id.pop(doc_id, None)
+        if entry is None:
+            return
+        i = bisect.bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            del self.entries[i]
+
+    def update(self, tracker):
+        self.remove(tracker.doc_id)
+        self.add(tracker)
+
+    def doc_ids(self, start: int = None, end: int = None):
+        return [doc_id for key, doc_id in self.entries[start:end]]
+
+    def doc_ids_below(self, key):
+        # (key,) sorts before every (key, doc_id) entry
+        return self.doc_ids(0, bisect.bisect_left(self.entries, (key,)))
+
+def name_tokens(name: str) -> set[str]:
+    """
+    The lowercase words of name together with '@word' for each word of the
+    segments after the first '@', e.g., 'Fill feeders @home @birds' gives
+    fill, feeders, home, birds, @home and @birds.
+    """
+    segments = name.lower().split('@')
+    tokens = set(WORD_REGEX.findall(name.lower()))
+    for segment in segments[1:]:
+        tokens.update(f"@{word}" for word in WORD_REGEX.findall(segment))
+    return tokens
+
+class NameIndex:
+    """
+    An inverted index from the tokens of the tracker names to the doc_ids
+    of the trackers with those tokens, kept in a persistent OOBTree of
+    IITreeSets so that it is saved with the trackers and only the changed
+    entries are written when a tracker is added, renamed or deleted.
+    """
+
+    def __init__(self, tokens) -> None:
+        self.tokens = tokens
+
+    def add(self, doc_id: int, name: str):
+        from BTrees.IIBTree import IITreeSet
+        for token in name_tokens(name):
+            if token not in self.tokens:
+                self.tokens[token] = IITreeSet()
+            self.tokens[token].insert(doc_id)
+
+    def remove(self, doc_id: int, name: str):
+        for token in name_tokens(name):
+            doc_ids = self.tokens.get(token)
+            if doc_ids is None:
+                continue
+            if doc_id in doc_ids:
+                doc_ids.remove(doc_id)
+            if not doc_ids:
+                del self.tokens[token]
+
+    def search(self, query: str):
+        """
+        Return the IITreeSet of the doc_ids of the trackers whose names have
+        a token beginning with each of the words in query, e.g., 'fee @ho'
+        matches 'Fill feeders @home' and a lone '@' matches any tag.
+        """
+        from BTrees.IIBTree import IITreeSet, multiunion, intersection
+        prefixes = []
+        for term in query.lower().split():
+            words = WORD_REGEX.findall(term)
+            if term.startswith('@'):
+                prefixes.append(f"@{words[0]}" if words else '@')
+                words = words[1:]
+            prefixes.extend(words)
+        result = None
+        for prefix in prefixes:
+            # the tokens beginning with prefix are a range of the keys
+            matches = multiunion(list(self.tokens.values(min=prefix, max=prefix + '\uffff')))
+            result = matches if result is None else intersection(result, matches)
+            if not result:
+                return IITreeSet()
+        return result if result is not None else IITreeSet()
+
+# the modules Tracker was pickled from before it moved to track_core,
+# '__main__' when track.py was run as a script
+legacy_modules = ['__main__', 'track']
+
+def class_factory(connection, modulename: str, globalname: str):
+    # the trackers of earlier versions load as Tracker, rather than as
+    # broken objects, and are pickled as track_core.Tracker when next saved
+    from ZODB.broken import find_global
+    if globalname == 'Tracker' and modulename in legacy_modules:
+        return Tracker
+    return find_global(modulename, globalname)
+
+def server_address(db_path: str) -> str:
+    # the Unix socket of the track server for db_path
+    return os.path.join(os.path.dirname(db_path), 'track.sock')
+
+class TrackerManager:
+    labels = "abcdefghijklmnopqrstuvwxyz"
+    due_views = ['overdue', 'today', 'week']
+    row_cache_size = 26 * 8
+
+    def __init__(self, db_path=None) -> None:
+        if db_path is None:
+            db_path = os.path.join(os.getcwd(), "tracker.fs")
+        self.db_path = db_path
+        self.trackers = {}
+        self.tag_to_id = {}
+        self.row_to_id = {}
+        self.tag_to_row = {}
+        self.id_to_times = {}
+        self.indexes = {} # sort_by -> SortedIndex, built on first use
+        self.row_cache = {} # doc_id -> (stamp, row, times) for recently listed trackers
+        self.filter_query = "" # only the trackers matching this are listed when set
+        self.filter_view = None # or one of due_views to list only those trackers
+        self.filtered = None # ((sort_by, date), sorted doc_ids) matching the filter, built on first use
+        self.active_page = 0
+        from ZODB import DB
+        self.server = None # the address of the track server when connected to one
+        self.storage = self.open_storage()
+        self.db = DB(self.storage, class_factory=class_factory)
+        self.connection = self.db.open()
+        self.root = self.connection.root()
+        self.sort_by = "forecast"  # default sort order, also "latest", "name"
+        logger.debug(f"using data from\n  {self.db_path}")
+        try:
+            self.load_data()
+        except Exception:
+            # release the datastore for the next attempt to open it
+            transaction.abort()
+            self.connection.close()
+            self.db.close()
+            raise
+        self.last_transaction = self.db.lastTransaction()
+
+    def open_storage(self):
+        """
+        Connect to the track server for db_path if one is running, see
+        track_server.py, otherwise open db_path itself.
+        """
+        from track_server import is_listening
+        address = server_address(self.db_path)
+        if os.path.exists(address) and not is_listening(address):
+            # left behind by a server that did not stop cleanly, which
+            # 'track serve' removes when it next starts
+            logger.info(f"not using the server at {address}: nothing is listening")
+        elif os.path.exists(address):
+            try:
+                from ZEO.ClientStorage import ClientStorage
+                from zc.lockfile import LockError
+                storage = None
+                cache_size = persistent_cache_size()
+                if cache_size:
+                    try:
+                        storage = ClientStorage(address, cache_size=cache_size, client='track', var=os.path.dirname(self.db_path), wait_timeout=5)
+                    except LockError:
+                        # another process is using the cache file
+                        pass
+                if storage is None:
+                    storage = ClientStorage(address, cache_size=client_cache_size, wait_timeout=5)
+                self.server = address
+                logger.info(f"connected to the server at {address}")
+                return storage
+            except Exception as e:
+                logger.info(f"not using the server at {address}: {e}")
+        from ZODB import FileStorage
+        return FileStorage.FileStorage(self.db_path)
+
+    def sync(self) -> bool:
+        """
+        Pick up the changes committed by other processes sharing the server
+        and return True if there were any. Since there is no telling which
+        trackers they changed, the indexes are then rebuilt when next used.
+        """
+        last_transaction = self.db.lastTransaction()
+        if last_transaction == self.last_transaction:
+            return False
+        # a new transaction applies the invalidations from the server up to
+        # at least last_transaction. It also aborts anything uncommitted so
+        # every change, e.g., record_completion, commits as it is made.
+        self.connection.sync()
+        self.last_transaction = last_transaction
+        self.indexes = {}
+        self.filtered = None
+        self.row_cache.clear()
+        return True
+
+    def load_data(self):
+        # any error is left to the caller rather than carrying on with an
+        # empty list whose changes would never be saved
+        from BTrees.OOBTree import OOBTree
+        if 'settings' not in self.root:
+            self.root['settings'] = settings_map
+            transaction.commit()
+        self.settings = self.root['settings']
+        Tracker.settings = self.settings
+        missing = [key for key in settings_map if key not in self.settings]
+        if missing:
+            # settings added since the datastore was created
+            for key in missing:
+                self.settings[key] = settings_map[key]
+            # the settings map is not persistent so flag its container
+            self.root._p_changed = True
+            transaction.commit()
+        if 'trackers' not in self.root:
+            self.root['trackers'] = OOBTree()
+            self.root['next_id'] = 1  # Initialize the ID counter
+            transaction.commit()
+        elif not isinstance(self.root['trackers'], OOBTree):
+            self.migrate_trackers()
+        self.trackers = self.root['trackers']
+        if 'name_index' not in self.root:
+            self.build_name_index()
+        self.name_index = NameIndex(self.root['name_index'])
+
+    def migrate_trackers(self):
+        # Earlier versions kept the trackers in a plain dict which was
+        # re-pickled in its entirety on every commit. An OOBTree only writes
+        # the buckets that actually changed.
+        from BTrees.OOBTree import OOBTree
+        trackers = OOBTree()
+        trackers.update(self.root['trackers'])
+        self.root['trackers'] = trackers
+        transaction.commit()
+        logger.info(f"Migrated {len(trackers)} trackers to OOBTree storage.")
+
+    def build_name_index(self):
+        # for datastores created before trackers could be searched
+        from BTrees.OOBTree import OOBTree
+        self.root['name_index'] = OOBTree()
+        name_index = NameIndex(self.root['name_index'])
+        for doc_id, tracker in self.trackers.items():
+            name_index.add(doc_id, tracker.name)
+        transaction.commit()
+        logger.info(f"Indexed the names of {len(self.trackers)} trackers.")
+
+    def restore_defaults(self):
+        self.root['settings'] = settings_map
+        self.settings = self.root['settings']
+        Tracker.settings = self.settings
+        transaction.commit()
+        logger.info(f"Restored default settings:\n{self.settings}")
+        self.refresh_info()
+
+    def refresh_info(self):
+        compute_info_batch(list(self.trackers.values()))
+        # forecasts may have changed so rebuild the indexes when next needed
+        self.indexes = {}
+        self.filtered = None
+        self.row_cache.clear()
+        logger.info("Refreshed tracker info.")
+
+    def set_setting(self, key, value):
+
+        if key in self.settings:
+            self.settings[key] = value
+            self.zodb_root[0] = self.settings  # Update the ZODB storage
+            transaction.commit()
+        else:
+            print(f"Setting '{key}' not found.")
+
+    def get_setting(self, key):
+        return self.settings.get(key, None)
+
+    def new_doc_ids(self, count: int = 1) -> range:
+        """
+        Take the next count doc_ids from root['next_id'] in a transaction of
+        its own, retried if another process sharing the server takes some at
+        the same time, so that the doc_ids of trackers added at once never
+        collide and committing the trackers never conflicts over the counter.
+        """
+        transaction_manager = transaction.TransactionManager()
+        connection = self.db.open(transaction_manager=transaction_manager)
+        try:
+            for attempt in transaction_manager.attempts(5):
+                with attempt:
+                    root = connection.root()
+                    doc_id = root['next_id']
+                    root['next_id'] = doc_id + count
+        finally:
+            connection.close()
+        return range(doc_id, doc_id + count)
+
+    def add_tracker(self, name: str, save: bool = True, doc_id: int = None) -> None:
+        if doc_id is None:
+            doc_id = self.new_doc_ids()[0]
+        def add():
+            # Create a new tracker with the current doc_id
+            tracker = Tracker(name, doc_id)
+            # Add the tracker to the trackers dictionary
+            self.trackers[doc_id] = tracker
+            self.name_index.add(doc_id, name)
+            self.reindex(tracker)
+        # Save the updated data unless the caller will commit
+        if save:
+            self.save_data(add)
+        else:
+            add()
+
+        logger.debug(f"Tracker '{name}' added with ID {doc_id}")
+        return doc_id
+
+
+    def record_completion(self, doc_id: int, comp: tuple[datetime, timedelta], save: bool = True):
+        # dt will be a datetime
+        def record():
+            ok, msg = self.trackers[doc_id].record_completion(comp)
+            if ok:
+                self.reindex(self.trackers[doc_id])
+            return ok, msg
+        return self.save_data(record) if save else record()
+
+    def record_completions(self, doc_id: int, completions: list[tuple[datetime, timedelta]], save: bool = True):
+        def record():
+            ok, msg = self.trackers[doc_id].record_completions(completions)
+            if ok:
+                self.reindex(self.trackers[doc_id])
+            return ok, msg
+        return self.save_data(record) if save else record()
+
+
+    def get_tracker_data(self, doc_id: int = None):
+        if doc_id is None:
+            logger.debug("data for all trackers:")
+            for k, v in self.trackers.items():
+                logger.debug(f"   {k:2> }. {v.get_tracker_data()}")
+        elif doc_id in self.trackers:
+            logger.debug(f"data for tracker {doc_id}:")
+            logger.debug(f"   {doc_id:2> }. {self.trackers[doc_id].get_tracker_data()}")
+
+    def rename_tracker(self, doc_id: int, name: str):
+        def rename():
+            self.name_index.remove(doc_id, self.trackers[doc_id].name)
+            self.trackers[doc_id].rename(name)
+            self.name_index.add(doc_id, name)
+            self.reindex(self.trackers[doc_id])
+        self.save_data(rename)
+
+    def search(self, query: str) -> list:
+        """
+        The trackers whose names match query, see NameIndex.search, in the
+        current sort order.
+        """
+        trackers = [self.trackers[doc_id] for doc_id in self.name_index.search(query)]
+        return sorted(trackers, key=lambda tracker: (self.sort_key(tracker), tracker.doc_id))
+
+    def set_filter(self, query: str):
+        # an empty query lists all the trackers again
+        self.filter_query = query.strip()
+        self.filtered = None
+        self.active_page = 0
+
+    def set_view(self, view: str = None):
+        # None lists all the trackers again
+        self.filter_view = view
+        self.filtered = None
+        self.active_page = 0
+
+    def due(self, view: str, now: datetime = None) -> list[int]:
+        """
+        The doc_ids of the trackers in view, one of due_views, using the
+        indexes of the early and late dates so that only the trackers due
+        before the end of the view are visited:
+
+            overdue: the late date is today or earlier
+            today:   the early date is today or earlier but not overdue
+            week:    the early date is within the next 7 days but not overdue
+        """
+        today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        tomorrow = today + timedelta(days=1)
+        overdue = self.get_index('late').doc_ids_below((0, tomorrow))
+        if view == 'overdue':
+            return overdue
+        end = tomorrow if view == 'today' else today + timedelta(days=7)
+        overdue = set(overdue)
+        return [doc_id for doc_id in self.get_index('early').doc_ids_below((0, end)) if doc_id not in overdue]
+
+    def sort_key(self, tracker, sort_by: str = None):
+        sort_by = sort_by or self.sort_by
+        forecast_dt = tracker.info.get('next_expected_completion', None)
+        latest_dt = tracker.info.get('last_completion', None)
+        if sort_by == "forecast":
+            if forecast_dt:
+                return (0, forecast_dt)
+            if latest_dt:
+                return (1, latest_dt)
+            return (2, tracker.doc_id)
+        if sort_by == "latest":
+            if latest_dt:
+                return (1, latest_dt)
+            if forecast_dt:
+                return (2, forecast_dt)
+            return (0, tracker.doc_id)
+        elif sort_by == "name":
+            return (0, tracker.name)
+        elif sort_by == "id":
+            return (0, tracker.doc_id)
+        elif sort_by in ("early", "late"):
+            # only used by due, trackers without forecasts come last
+            dt = tracker.info.get(sort_by, None)
+            return (0, dt) if dt else (1, tracker.doc_id)
+        else: # forecast
+            if forecast_dt:
+                return (0, forecast_dt)
+            if latest_dt:
+                return (1, latest_dt)
+            return (2, tracker.doc_id)
+
+    def get_index(self, sort_by: str = None):
+        sort_by = sort_by or self.sort_by
+        if sort_by not in self.indexes:
+            self.indexes[sort_by] = SortedIndex(lambda tracker: self.sort_key(tracker, sort_by), self.trackers)
+        return self.indexes[sort_by]
+
+    def reindex(self, tracker):
+        # keep every index that has been built in step with this tracker
+        for index in self.indexes.values():
+            index.update(tracker)
+        self.filtered = None
+
+    def get_filtered(self) -> list[int]:
+        # the due views change with the date as well as the trackers
+        stamp = (self.sort_by, date.today())
+        if self.filtered is None or self.filtered[0] != stamp:
+            if self.filter_view:
+                doc_ids = self.due(self.filter_view)
+                if self.filter_query:
+                    matches = self.name_index.search(self.filter_query)
+                    doc_ids = [doc_id for doc_id in doc_ids if doc_id in matches]
+                trackers = sorted((self.trackers[doc_id] for doc_id in doc_ids), key=lambda tracker: (self.sort_key(tracker), tracker.doc_id))
+            else:
+                trackers = self.search(self.filter_query)
+            self.filtered = (stamp, [tracker.doc_id for tracker in trackers])
+        return self.filtered[1]
+
+    def get_sorted_trackers(self, start: int = None, end: int = None):
+        if self.filter_query or self.filter_view:
+            return [self.trackers[doc_id] for doc_id in self.get_filtered()[start:end]]
+        return [self.trackers[doc_id] for doc_id in self.get_index().doc_ids(start, end)]
+
+    def num_pages(self):
+        if self.filter_query or self.filter_view:
+            return (len(self.get_filtered()) + 25) // 26
+        return (len(self.get_index()) + 25) // 26
+
+    def format_row(self, tracker, name_width: int, sigma: int):
+        """
+        Return the row, without its tag, and the (early, late) dates for
+        tracker. These only change when the tracker itself is modified, so
+        they are cached and reused until then.
+        """
+        stamp = (tracker.modified, name_width, sigma)
+        cached = self.row_cache.pop(tracker.doc_id, None)
+        if cached is None or cached[0] != stamp:
+            parts = [x.strip() for x in tracker.name.split('@')]
+            tracker_name = parts[0]
+            if len(tracker_name) > name_width:
+                tracker_name = tracker_name[:name_width - 1] + "…"
+            info = tracker.info
+            forecast_dt = info.get('next_expected_completion', None)
+            early = info.get('early', '')
+            late = info.get('late', '')
+            spread = info.get('spread', '')
+            # spread = f"±{Tracker.format_td(spread)[1:]: <8}" if spread else f"{'~': ^8}"
+            spread = f"{Tracker.format_td(sigma*spread)[1:]: <8}" if spread else f"{'~': ^8}"
+            if tracker.times:
+                latest = info['last_completion'][0].strftime("%y-%m-%d")
+            else:
+                latest = "~"
+            forecast = forecast_dt.strftime("%y-%m-%d") if forecast_dt else center_text("~", 8)
+            times = (early.strftime("%y-%m-%d") if early else '', late.strftime("%y-%m-%d") if late else '')
+            # rows.append(f" {tag}{" "*4}{forecast}{" "*2}{latest}{" "*2}{interval}{" " * 3}{tracker_name}")
+            cached = (stamp, f"{" "*4}{forecast}{" "*2}{spread}{" "*2}{latest}{" " * 3}{tracker_name}", times)
+        # re-inserting keeps the most recently listed rows at the end
+        self.row_cache[tracker.doc_id] = cached
+        if len(self.row_cache) > self.row_cache_size:
+            del self.row_cache[next(iter(self.row_cache))]
+        return cached[1], cached[2]
+
+    def list_trackers(self):
+        name_width = get_width() - 30
+        num_pages = self.num_pages()
+        if self.active_page >= num_pages > 0:
+            self.active_page = num_pages - 1
+        banner = f"{ZWNJ} tag   forecast  η spread   latest   name\n"
+        # only the active page is ever looked up so forget the others
+        self.tag_to_id.clear()
+        self.row_to_id.clear()
+        self.tag_to_row.clear()
+        self.id_to_times.clear()
+        rows = []
+        start_index = self.active_page * 26
+        end_index = start_index + 26
+        sigma = self.settings.get('η', 1)
+        for count, tracker in enumerate(self.get_sorted_trackers(start_index, end_index)):
+            row, times = self.format_row(tracker, name_width, sigma)
+            tag = TrackerManager.labels[count]
+            self.id_to_times[tracker.doc_id] = times
+            self.tag_to_id[(self.active_page, tag)] = tracker.doc_id
+            self.row_to_id[(self.active_page, count+1)] = tracker.doc_id
+            self.tag_to_row[(self.active_page, tag)] = count+1
+            rows.append(f" {tag}{row}")
+        return banner +"\n".join(rows)
+
+    def set_active_page(self, page_num):
+        if 0 <= page_num < self.num_pages():
+            self.active_page = page_num
+        else:
+            logger.debug("Invalid page number.")
+
+    def next_page(self):
+        self.set_active_page(self.active_page + 1)
+
+    def previous_page(self):
+        self.set_active_page(self.active_page - 1)
+
+    def first_page(self):
+        self.set_active_page(0)
+
+
+    def get_tracker_from_tag(self, tag: str):
+        pagetag = (self.active_page, tag)
+        if pagetag not in self.tag_to_id:
+            return None
+        return self.trackers[self.tag_to_id[pagetag]]
+
+    def get_tracker_from_row(self, row: int):
+        pagerow = (self.active_page, row)
+        if pagerow not in self.row_to_id:
+            return None
+        return self.trackers[self.row_to_id[pagerow]]
+
+    def save_data(self, change: Callable = None, attempts: int = 3):
+        """
+        Call change, if given, and commit, returning what change returns.
+        When the commit conflicts with one made at the same time by another
+        process sharing the server, e.g., both add trackers with a new word
+        in their names, it is aborted and change made again on top of the
+        other's, up to attempts times.
+        """
+        from ZODB.POSException import ConflictError
+        before = self.db.lastTransaction()
+        for attempt in range(attempts):
+            try:
+                result = change() if change else None
+                # self.trackers is the persistent OOBTree in root['trackers']
+                # so committing writes only the changed buckets and trackers
+                transaction.commit()
+                break
+            except ConflictError:
+                transaction.abort()
+                # the aborted change may be in the indexes
+                self.indexes = {}
+                self.filtered = None
+                self.row_cache.clear()
+                if change is None or attempt == attempts - 1:
+                    raise
+                logger.info(f"retrying a change that conflicted with another process: attempt {attempt + 2}")
+        if before == self.last_transaction and attempt == 0:
+            # sync need not rebuild the indexes for our own changes, unless
+            # another process committed since the last sync
+            self.last_transaction = self.db.lastTransaction()
+        return result
+
+    def update_tracker(self, doc_id, tracker):
+        def update():
+            if doc_id in self.trackers:
+                self.name_index.remove(doc_id, self.trackers[doc_id].name)
+            self.trackers[doc_id] = tracker
+            self.name_index.add(doc_id, tracker.name)
+            self.reindex(tracker)
+        self.save_data(update)
+
+    def delete_tracker(self, doc_id):
+        def delete():
+            if doc_id in self.trackers:
+                self.name_index.remove(doc_id, self.trackers[doc_id].name)
+                del self.trackers[doc_id]
+                for index in self.indexes.values():
+                    index.remove(doc_id)
+                self.filtered = None
+                self.row_cache.pop(doc_id, None)
+        self.save_data(delete)
+
+    def edit_tracker_history(self, label: str):
+        tracker = self.get_tracker_from_tag(label)
+        if tracker:
+            tracker.edit_history()
+            self.save_data()
+        else:
+            logger.debug(f"No tracker found corresponding to label {label}.")
+
+    def get_tracker_from_id(self, doc_id):
+        return self.trackers.get(doc_id, None)
+
+    def pack(self, days: int = None) -> tuple[bool, str]:
+        """
+        Pack the datastore, discarding the old revisions of objects made
+        more than days, by default the 'pack_days' setting, ago. ZODB packs
+        alongside ongoing transactions so this can be called from a thread.
+        """
+        days = self.settings.get('pack_days', 0) if days is None else days
+        if days <= 0:
+            return False, "Pack skipped - packing is disabled"
+        before = self.storage.getSize()
+        started = time.perf_counter()
+        self.db.pack(days=days)
+        elapsed = time.perf_counter() - started
+        # before record_pack adds a transaction of its own
+        after = self.storage.getSize()
+        self.record_pack()
+        return True, f"Packed {self.db_path} keeping {days} days: {before} bytes to {after} in {elapsed:.2f} seconds"
+
+    def record_pack(self):
+        # pack may be called from a thread so the time of the pack is
+        # committed with a connection of its own rather than joining
+        # whatever the interface has under way
+        transaction_manager = transaction.TransactionManager()
+        connection = self.db.open(transaction_manager=transaction_manager)
+        try:
+            connection.root()['last_pack'] = datetime.now()
+            transaction_manager.commit()
+        finally:
+            connection.close()
+
+    def pack_overdue(self, days: int = 7) -> bool:
+        """
+        True if packing is enabled and the datastore has not been packed
+        in the last days, e.g., since the weekly pack was missed while
+        nothing had the datastore open.
+        """
+        if self.settings.get('pack_days', 0) <= 0:
+            return False
+        last_pack = self.root.get('last_pack')
+        return last_pack is None or datetime.now() - last_pack > timedelta(days=days)
+
+    def close(self):
+        # Make sure to commit or abort any ongoing transaction
+        try:
+            if self.connection.transaction_manager.isDoomed():
+                logger.error("Transaction aborted.")
+                transaction.abort()
+            else:
+                logger.info("Transaction committed.")
+                transaction.commit()
+        except Exception as e:
+            logger.error(f"Error during transaction handling: {e}")
+            transaction.abort()
+        else:
+            logger.info("Transaction handled successfully.")
+        finally:
+            self.connection.close()
+            # closing the storage saves track.fs.index so that the next
+            # open doesn't have to rebuild it by reading all of track.fs
+            self.db.close()
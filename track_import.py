@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Bulk import of completion histories from CSV or JSON-lines files.
+
+Each row gives a tracker, a completion datetime and, optionally, an
+offset:
+
+    CSV:         bird feeders, 2024-10-01T08:30, +1d
+    JSON-lines:  {"tracker": 12, "datetime": "2024-10-01T08:30:00", "offset": 86400}
+
+The tracker is either a doc_id or a name, and a tracker is created for any
+name that does not yet exist. Datetimes in ISO format are parsed directly
+with datetime.fromisoformat, anything else with Tracker.parse_dt. Offsets
+are either a number of seconds or a timedelta such as '+1d' or '-2h'.
+
+Rows are read one at a time and the completions are collected per tracker
+until batch_size rows are pending. These are then merged into the trackers'
+histories, the info for the affected trackers is recomputed and the batch
+is committed in a single transaction, so memory use depends only upon
+batch_size and not upon the size of the file.
+"""
+import csv
+import json
+import logging
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Iterator
+
+import transaction
+
+from track_core import Tracker, TrackerManager, compute_info_batch
+
+logger = logging.getLogger()
+
+header_names = ['tracker', 'name', 'doc_id', 'id']
+
+
+def get_format(path: str) -> str:
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, format: str = 'csv') -> Iterator[tuple[int, list]]:
+    """
+    Yield (line number, [tracker, datetime, offset]) for each row of stream,
+    skipping blank lines and a CSV header.
+    """
+    if format == 'jsonl':
+        for num, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield num, e
+                continue
+            if isinstance(row, dict):
+                tracker = row.get('tracker', row.get('doc_id', row.get('name')))
+                row = [tracker, row.get('datetime'), row.get('offset')]
+            yield num, row
+    else:
+        for num, row in enumerate(csv.reader(stream, skipinitialspace=True), 1):
+            if not row or not any(x.strip() for x in row):
+                continue
+            if num == 1 and row[0].strip().lower() in header_names:
+                continue
+            yield num, row
+
+
+def parse_datetime(dt) -> tuple[bool, datetime]:
+    try:
+        dt = datetime.fromisoformat(dt)
+    except (TypeError, ValueError):
+        if not isinstance(dt, str):
+            return False, f"Invalid datetime: {dt}"
+        ok, dt = Tracker.parse_dt(dt)
+        if not ok:
+            return False, dt
+    if dt.tzinfo is not None:
+        # track uses naive local datetimes
+        dt = dt.astimezone().replace(tzinfo=None)
+    return True, dt
+
+
+def parse_offset(td) -> tuple[bool, timedelta]:
+    if td is None or td == "":
+        return True, timedelta(0)
+    try:
+        if isinstance(td, (int, float)):
+            return True, timedelta(seconds=td)
+        try:
+            return True, timedelta(seconds=float(td))
+        except ValueError:
+            return Tracker.parse_td(td.strip())
+    except (OverflowError, ValueError, TypeError):
+        # e.g., inf, nan, a huge number of seconds or a list
+        return False, f"Invalid offset: {td}"
+
+
+def parse_row(row: list) -> tuple[bool, tuple]:
+    """
+    Return (True, (tracker, seconds, offset seconds)) where tracker is a
+    doc_id or a name, or (False, msg).
+    """
+    if not isinstance(row, list) or len(row) < 2 or row[0] in (None, "") or not row[1]:
+        return False, f"Expected tracker, datetime and optionally offset but got {row}"
+    tracker = row[0]
+    if isinstance(tracker, bool) or not isinstance(tracker, (str, int)):
+        return False, f"Expected a tracker name or doc_id but got {tracker!r}"
+    if isinstance(tracker, str):
+        tracker = tracker.strip()
+        tracker = int(tracker) if tracker.isdigit() else tracker
+    ok, dt = parse_datetime(row[1].strip() if isinstance(row[1], str) else row[1])
+    if not ok:
+        return False, dt
+    ok, td = parse_offset(row[2] if len(row) > 2 else None)
+    if not ok:
+        return False, td
+    return True, (tracker, Tracker.dt2seconds(dt), int(td.total_seconds()))
+
+
+class Importer:
+    """
+    Merge rows of completions into the trackers of tracker_manager,
+    committing every batch_size rows.
+    """
+
+    def __init__(self, tracker_manager: TrackerManager, batch_size: int = 100000) -> None:
+        self.tracker_manager = tracker_manager
+        self.batch_size = batch_size
+        self.doc_id_for_name = None
+        # the names of the trackers to be added by the next flush, by the
+        # negative doc_ids standing in for theirs until then
+        self.new_names = {}
+        # and by their own doc_ids once these have been taken
+        self.added = {}
+        self.pending = {}
+        self.num_pending = 0
+        self.num_completions = 0
+        self.num_created = 0
+        self.updated = set()
+        # only the first few errors are kept
+        self.num_errors = 0
+        self.errors = []
+
+    def get_doc_id(self, tracker) -> int:
+        trackers = self.tracker_manager.trackers
+        if isinstance(tracker, int):
+            return tracker if tracker in trackers else None
+        if self.doc_id_for_name is None:
+            # the first tracker with a given name gets the completions
+            self.doc_id_for_name = {}
+            for doc_id, existing in trackers.items():
+                self.doc_id_for_name.setdefault(existing.name, doc_id)
+        doc_id = self.doc_id_for_name.get(tracker)
+        if doc_id is None:
+            doc_id = -1 - len(self.new_names)
+            self.new_names[doc_id] = tracker
+            self.doc_id_for_name[tracker] = doc_id
+            self.num_created += 1
+        return doc_id
+
+    def take_doc_ids(self) -> None:
+        # the doc_ids of all the new trackers are taken at once
+        doc_ids = self.tracker_manager.new_doc_ids(len(self.new_names))
+        for placeholder, doc_id in zip(self.new_names, doc_ids):
+            name = self.new_names[placeholder]
+            self.added[doc_id] = name
+            self.doc_id_for_name[name] = doc_id
+            self.pending[doc_id] = self.pending.pop(placeholder)
+        self.new_names = {}
+
+    def error(self, msg: str) -> None:
+        self.num_errors += 1
+        if len(self.errors) < 20:
+            self.errors.append(msg)
+
+    def add(self, num: int, row) -> None:
+        ok, parsed = parse_row(row) if not isinstance(row, Exception) else (False, str(row))
+        if not ok:
+            self.error(f"line {num}: {parsed}")
+            return
+        tracker, seconds, offset = parsed
+        doc_id = self.get_doc_id(tracker)
+        if doc_id is None:
+            self.error(f"line {num}: no tracker with doc_id {tracker}")
+            return
+        times, offsets = self.pending.setdefault(doc_id, (array('q'), array('q')))
+        times.append(seconds)
+        offsets.append(offset)
+        self.num_pending += 1
+        if self.num_pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        if self.new_names:
+            self.take_doc_ids()
+
+        def merge():
+            # made again if the commit conflicts with another process
+            for doc_id, name in self.added.items():
+                self.tracker_manager.add_tracker(name, save=False, doc_id=doc_id)
+            trackers = []
+            for doc_id, (times, offsets) in self.pending.items():
+                tracker = self.tracker_manager.trackers[doc_id]
+                tracker.merge_completions(times, offsets)
+                trackers.append(tracker)
+            compute_info_batch(trackers)
+            for tracker in trackers:
+                self.tracker_manager.reindex(tracker)
+
+        self.tracker_manager.save_data(merge)
+        logger.debug(f"committed {self.num_pending} completions for {len(self.pending)} trackers")
+        self.added = {}
+        self.num_completions += self.num_pending
+        self.updated.update(self.pending)
+        self.pending = {}
+        self.num_pending = 0
+
+    def run(self, rows: Iterator[tuple[int, list]]) -> None:
+        try:
+            for num, row in rows:
+                self.add(num, row)
+            self.flush()
+        except BaseException:
+            transaction.abort()
+            raise
+
+
+def import_completions(tracker_manager: TrackerManager, path: str, format: str = None, batch_size: int = 100000) -> tuple[bool, str]:
+    """
+    Import the completions in path, '-' for stdin, and return (ok, msg)
+    summarizing the results.
+    """
+    format = format or get_format(path)
+    started = time.perf_counter()
+    importer = Importer(tracker_manager, batch_size)
+    if path == '-':
+        importer.run(read_rows(sys.stdin, format))
+    else:
+        with open(path, newline='', encoding='utf-8') as stream:
+            importer.run(read_rows(stream, format))
+    elapsed = time.perf_counter() - started
+    msg = [f"Imported {importer.num_completions} completions for {len(importer.updated)} trackers ({importer.num_created} new) in {elapsed:.2f} seconds"]
+    logger.info(msg[0])
+    if importer.num_errors:
+        msg.append(f"Skipped {importer.num_errors} rows:")
+        msg.extend(f"   {error}" for error in importer.errors)
+        if importer.num_errors > len(importer.errors):
+            msg.append("   ...")
+    return not importer.num_errors, "\n".join(msg)
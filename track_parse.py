@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tokenizers for the completions, datetimes and durations entered in track.
+
+A completion is a datetime optionally followed by a comma and a duration,
+e.g., '3p, +1d', and a history is a list of completions separated by '; '
+as written by Tracker.format_history. The regular expressions are compiled
+once here and parsed durations are cached since the same few, e.g., '+0m',
+recur throughout a history.
+"""
+import functools
+import re
+from datetime import timedelta
+
+from dateutil.parser import parserinfo
+
+COMPLETIONS_SEPARATOR = '; '
+COMPLETION_REGEX = re.compile(r',\s+')
+
+PERIOD_REGEX = re.compile(r'(([+-]?)(\d+)([dhms]))+?')
+EXPANDED_PERIOD_REGEX = re.compile(r'(([+-]?)(\d+)\s(day|hour|minute|second)s?)+?')
+
+# The datetimes track itself writes, "%y%m%dT%H%M" from format_dt and
+# "%Y-%m-%d %H:%M" from format_completion, together with ISO dates and
+# datetimes are parsed directly by parse_dt. Everything else goes to dateutil.
+ISO_DT_REGEX = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?$')
+COMPACT_DT_REGEX = re.compile(r'(\d{2})(\d{2})(\d{2})T(\d{2})(\d{2})$')
+
+period_names = {
+    'd': 'days',
+    'day': 'days',
+    'days': 'days',
+    'h': 'hours',
+    'hour': 'hours',
+    'hours': 'hours',
+    'm': 'minutes',
+    'minute': 'minutes',
+    'minutes': 'minutes',
+    's': 'seconds',
+    'second': 'seconds',
+    'seconds': 'seconds',
+}
+
+
+@functools.lru_cache(maxsize=4)
+def get_parserinfo(dayfirst: bool, yearfirst: bool) -> parserinfo:
+    return parserinfo(dayfirst=dayfirst, yearfirst=yearfirst)
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_td(td: str) -> tuple[bool, timedelta]:
+    """\
+    Take a period string and return a corresponding timedelta.
+    Examples:
+        parse_td('-2d3h5m') = (True, timedelta(days=-2, hours=3, minutes=5))
+        parse_td('1h30m') = (True, timedelta(hours=1, minutes=30))
+        parse_td('-10m') = (True, timedelta(minutes=-10))
+        parse_td('2 days') = (True, timedelta(days=2))
+    where:
+        d: days
+        h: hours
+        m: minutes
+        s: seconds
+    """
+    m = PERIOD_REGEX.findall(td)
+    if not m:
+        m = EXPANDED_PERIOD_REGEX.findall(str(td))
+        if not m:
+            return False, f"Invalid period string '{td}'"
+    kwds = {
+        'days': 0,
+        'hours': 0,
+        'minutes': 0,
+        'seconds': 0,
+    }
+    for g in m:
+        if g[3] not in period_names:
+            return False, f'Invalid period argument: {g[3]}'
+
+        num = -int(g[2]) if g[1] == '-' else int(g[2])
+        if num:
+            kwds[period_names[g[3]]] = num
+    return True, timedelta(**kwds)
+
+
+def split_completion(completion: str) -> tuple[str, str]:
+    """
+    Return the datetime and duration strings of completion, the latter
+    empty when there is no duration.
+    """
+    parts = [x.strip() for x in COMPLETION_REGEX.split(completion)]
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+def split_completions(completions: str) -> list[str]:
+    return [x.strip() for x in completions.split(COMPLETIONS_SEPARATOR) if x.strip()]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+A scheduler for the periodic jobs of the interface - the status bar clock,
+the day rollover, the daily backup and the weekly pack.
+
+The jobs are kept in a heap ordered by the datetime of their next run and
+the scheduler runs as a single task on prompt_toolkit's asyncio event loop,
+sleeping until the earliest of these. Jobs that are quick, like updating
+the status bar, run on the event loop itself. Jobs that may take a while,
+like backups, are given blocking=True and run in a thread of the loop's
+default executor so they never hold up rendering or key handling.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+from typing import Callable
+
+logger = logging.getLogger()
+
+
+def every(seconds: int) -> Callable[[datetime], datetime]:
+    """
+    Return a next_time function for the next datetime after now whose
+    seconds past the minute are a multiple of seconds.
+    """
+    def next_time(now: datetime) -> datetime:
+        now = now.replace(microsecond=0)
+        return now + timedelta(seconds=seconds - now.second % seconds)
+    return next_time
+
+
+def at_midnight(now: datetime) -> datetime:
+    return datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+
+
+def weekly(weekday: int) -> Callable[[datetime], datetime]:
+    """
+    Return a next_time function for the next midnight that begins weekday,
+    0 for Monday through 6 for Sunday.
+    """
+    def next_time(now: datetime) -> datetime:
+        days = (weekday - now.weekday() - 1) % 7 + 1
+        return datetime.combine(now.date() + timedelta(days=days), datetime.min.time())
+    return next_time
+
+
+class Job:
+    def __init__(self, name: str, func: Callable, next_time: Callable[[datetime], datetime], blocking: bool = False) -> None:
+        self.name = name
+        self.func = func
+        self.next_time = next_time
+        self.blocking = blocking
+        self.running = False
+
+
+class Scheduler:
+    def __init__(self, clock: Callable[[], datetime] = datetime.now) -> None:
+        # the current time, replaced in tests
+        self.clock = clock
+        self.heap = []
+        # breaks ties between jobs due at the same time
+        self.counter = itertools.count()
+        self.changed = None
+
+    def add(self, name: str, func: Callable, next_time: Callable[[datetime], datetime], blocking: bool = False, first: datetime = None) -> Job:
+        """
+        Schedule func to run at first, if given, otherwise at next_time(now),
+        and thereafter at next_time of the time of its last run.
+        """
+        job = Job(name, func, next_time, blocking)
+        self.push(job, first or next_time(self.clock()))
+        return job
+
+    def push(self, job: Job, when: datetime) -> None:
+        heapq.heappush(self.heap, (when, next(self.counter), job))
+        if self.changed is not None:
+            # wake the scheduler in case this job is due before the others
+            self.changed.set()
+
+    async def run_blocking(self, job: Job) -> None:
+        job.running = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, job.func)
+        except Exception as e:
+            logger.error(f"job {job.name} failed: {e}")
+        finally:
+            job.running = False
+
+    def run_job(self, job: Job) -> None:
+        if job.blocking:
+            if job.running:
+                logger.info(f"job {job.name} is still running from last time")
+            else:
+                asyncio.get_running_loop().create_task(self.run_blocking(job))
+            return
+        try:
+            job.func()
+        except Exception as e:
+            logger.error(f"job {job.name} failed: {e}")
+
+    async def run(self) -> None:
+        self.changed = asyncio.Event()
+        while self.heap:
+            when, count, job = self.heap[0]
+            delay = (when - self.clock()).total_seconds()
+            if delay > 0:
+                self.changed.clear()
+                try:
+                    await asyncio.wait_for(self.changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.heap)
+            self.run_job(job)
+            self.push(job, job.next_time(self.clock()))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+A local server that lets several track processes share one datastore.
+
+Normally the interface, or a headless command, opens track.fs itself and
+the lock FileStorage takes on it keeps any other process from opening it
+at the same time. Running
+
+    track serve
+
+instead serves track.fs with ZEO over the Unix socket track.sock in the
+home directory. While the server runs, TrackerManager connects to it rather
+than opening track.fs so any number of interfaces, 'track record' from cron
+jobs and reports can use the datastore at once. Each of them keeps the
+objects it reads in a client cache in memory. With TRACKCACHE set to a
+number of MB, the first of them keeps a cache of that size in the home
+directory instead, track-1.zec, so a restart does not have to read every
+tracker again. A track.sock left behind by a server that did not stop
+cleanly is ignored.
+
+When two processes change the same tracker at once, e.g., each records a
+completion, the server merges the changes with Tracker._p_resolveConflict
+instead of failing the second commit. Other conflicting changes, e.g., two
+trackers added at once with a new word in both names, are made again on
+top of the other's by TrackerManager.save_data. The doc_ids of new
+trackers are taken in transactions of their own, see new_doc_ids, so they
+never collide. The interface checks for changes made by the other
+processes with each tick of the status clock.
+
+Since the server holds track.fs, it makes the daily backups and the weekly
+pack that the interface makes otherwise, packing at startup as well when
+the last pack was more than a week ago.
+
+ZEO is optional: pip install ZEO.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+from datetime import datetime
+
+from track_backup import backup_name, list_backups, prune_backups, run_backup
+from track_core import TrackerManager, server_address
+from track_schedule import Scheduler, at_midnight, weekly
+
+logger = logging.getLogger()
+
+
+def is_listening(address: str) -> bool:
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(address)
+        except OSError:
+            return False
+    return True
+
+
+class Server:
+    """
+    Serve db_file over its server_address, backing it up each day to
+    backup_dir and packing it each week keeping pack_days of history.
+    """
+
+    def __init__(self, db_file: str, backup_dir: str) -> None:
+        self.db_file = db_file
+        self.backup_dir = backup_dir
+        self.address = server_address(db_file)
+        self.storage = None
+        self.pack_days = 0
+        self.pack_overdue = False
+        # backups and packs are never made at the same time
+        self.lock = threading.Lock()
+
+    def backup(self):
+        name = backup_name(self.db_file)
+        with self.lock:
+            names = list_backups(self.backup_dir)
+            if name in names:
+                msg = f"Backup skipped - backup file already exists: {name}.zip"
+            else:
+                ok, msg = run_backup(self.db_file, self.storage.getSize(), self.backup_dir, name, names)
+        logger.info(msg)
+        remove = prune_backups(self.backup_dir)
+        if remove:
+            logger.info(f"Removing backup: {', '.join(remove)}")
+
+    def pack(self):
+        # packed through a connection to the server itself so that the time
+        # of the pack is recorded in the datastore as the interface's are
+        with self.lock:
+            tracker_manager = TrackerManager(self.db_file)
+            try:
+                ok, msg = tracker_manager.pack(self.pack_days)
+            finally:
+                tracker_manager.close()
+        logger.info(msg)
+
+    def start_jobs(self):
+        # the scheduler of the interface, on an event loop of its own
+        scheduler = Scheduler()
+        scheduler.add('backup', self.backup, at_midnight, blocking=True, first=datetime.now())
+        if self.pack_days > 0:
+            scheduler.add('pack', self.pack, weekly(0), blocking=True, first=datetime.now() if self.pack_overdue else None)
+        threading.Thread(target=asyncio.run, args=(scheduler.run(),), daemon=True).start()
+
+    def run(self) -> tuple[bool, str]:
+        try:
+            from ZEO.StorageServer import StorageServer
+        except ImportError:
+            return False, "track serve needs ZEO - pip install ZEO"
+        from ZODB.FileStorage import FileStorage
+        from zc.lockfile import LockError
+        if os.path.exists(self.address):
+            if is_listening(self.address):
+                return False, f"A server is already running on {self.address}"
+            # left behind by a server that did not stop cleanly
+            os.remove(self.address)
+        try:
+            # this also brings an older datastore up to date before it is served
+            tracker_manager = TrackerManager(self.db_file)
+            self.pack_days = tracker_manager.settings.get('pack_days', 0)
+            self.pack_overdue = tracker_manager.pack_overdue()
+            tracker_manager.close()
+            self.storage = FileStorage(self.db_file)
+        except LockError:
+            return False, f"{self.db_file} is in use by another process"
+        server = StorageServer(self.address, {'1': self.storage})
+        self.start_jobs()
+        # stop cleanly when terminated as well as on ^c
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        logger.info(f"serving {self.db_file} on {self.address}")
+        try:
+            server.loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # closing the server closes the storage and saves the index
+            server.close()
+            if os.path.exists(self.address):
+                os.remove(self.address)
+        return True, f"Stopped serving {self.db_file}"